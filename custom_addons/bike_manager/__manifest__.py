@@ -1,6 +1,6 @@
 {
     "name": "Bike Shop",
-    "version": "1.0.1",
+    "version": "1.0.3",
     "summary": "Gestion des ventes et des locations de vélos",
     "description": """
 Bike Shop
@@ -12,6 +12,7 @@ Ce module permet de gérer une boutique de vélos :
 - Ventes : commandes, lignes de commande, paiement, mise à jour du stock
 - Locations : contrats, tarification, suivi, retour, frais éventuels
 - Clients : fiche client + historique ventes et locations
+- Rapports : ventes par produit, taux d'occupation, revenus de location
 - Rapport PDF : contrat de location
 
 Interface et libellés en français.
@@ -46,6 +47,9 @@ Interface et libellés en français.
         # Séquences
         "data/sequences.xml",
 
+        # Tâches planifiées
+        "data/cron.xml",
+
         # Images des catégories
         "data/category_images.xml",
 
@@ -56,7 +60,11 @@ Interface et libellés en français.
         "views/bike_item_views.xml",
         "views/customer_views.xml",
         "views/rental_views.xml",
+        "views/rental_group_views.xml",
         "views/sale_order_views.xml",
+        "views/stock_views.xml",
+        "views/report_views.xml",
+        "views/perf_stat_views.xml",
         "views/menu.xml",
     ],
     "assets": {
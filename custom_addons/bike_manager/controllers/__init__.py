@@ -0,0 +1,2 @@
+from . import availability
+from . import image
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from werkzeug.exceptions import BadRequest
+
+from odoo import fields, http
+from odoo.http import request
+
+from ..models.availability import get_availability_generation
+from ..models.pricing import format_breakdown
+
+# Durée de vie des réponses en cache (secondes) et nombre maximal d'entrées
+AVAILABILITY_CACHE_TTL = 30
+AVAILABILITY_CACHE_SIZE = 512
+# Période maximale acceptée pour un devis (limite le calcul du meilleur tarif)
+AVAILABILITY_MAX_PERIOD = timedelta(days=90)
+
+# Cache du processus : clé -> (génération, expiration, ETag, corps JSON)
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _parse_datetime(value):
+    """Date UTC au format « AAAA-MM-JJ HH:MM:SS » (le « T » ISO 8601 est accepté)"""
+    try:
+        return fields.Datetime.to_datetime((value or "").replace("T", " ").rstrip("Z") or None)
+    except ValueError as e:
+        raise BadRequest("Dates invalides") from e
+
+
+def _parse_ids(value):
+    try:
+        return sorted({int(part) for part in (value or "").split(",") if part.strip()})
+    except ValueError as e:
+        raise BadRequest("Identifiants invalides") from e
+
+
+class BikeAvailabilityController(http.Controller):
+
+    @http.route("/bike_manager/availability", type="http", auth="public", methods=["GET"], cors="*")
+    def bike_availability(self, start=None, end=None, product_ids=None, category_id=None, **kwargs):
+        """
+        Vélos libres et meilleur tarif par produit louable sur [start, end).
+        Réponses mises en cache quelques secondes et invalidées dès qu'une
+        location, un vélo ou un tarif change (génération en base).
+        """
+        start_dt = _parse_datetime(start)
+        end_dt = _parse_datetime(end)
+        if not start_dt or not end_dt or end_dt <= start_dt:
+            raise BadRequest("Période invalide")
+        if end_dt - start_dt > AVAILABILITY_MAX_PERIOD:
+            raise BadRequest("Période trop longue")
+        product_list = _parse_ids(product_ids)
+        category_list = _parse_ids(category_id)
+
+        key = (request.db, start_dt, end_dt, tuple(product_list), tuple(category_list))
+        generation = get_availability_generation(request.env.cr)
+        now = time.monotonic()
+        with _cache_lock:
+            cached = _cache.get(key)
+            if cached and (cached[0] != generation or cached[1] < now):
+                del _cache[key]
+                cached = None
+        if cached:
+            etag, body = cached[2], cached[3]
+        else:
+            body = json.dumps(self._get_availability(start_dt, end_dt, product_list, category_list))
+            etag = '"%s"' % hashlib.sha1(body.encode()).hexdigest()
+            with _cache_lock:
+                _cache[key] = (generation, now + AVAILABILITY_CACHE_TTL, etag, body)
+                _cache.move_to_end(key)
+                while len(_cache) > AVAILABILITY_CACHE_SIZE:
+                    _cache.popitem(last=False)
+
+        headers = [
+            ("Cache-Control", "public, max-age=%s" % AVAILABILITY_CACHE_TTL),
+            ("ETag", etag),
+        ]
+        if etag in request.httprequest.headers.get("If-None-Match", ""):
+            return request.make_response(b"", headers=headers, status=304)
+        return request.make_response(body, headers=headers + [("Content-Type", "application/json")])
+
+    def _get_availability(self, start, end, product_ids, category_ids):
+        """Corps de la réponse : une requête pour les vélos libres, un calcul de tarif par produit"""
+        domain = [("can_be_rented", "=", True), ("product_type", "=", "bike")]
+        if product_ids:
+            domain.append(("id", "in", product_ids))
+        if category_ids:
+            domain.append(("category_id", "in", category_ids))
+        # Catalogue public : lecture en superutilisateur limitée aux produits louables
+        products = request.env["bike.product"].sudo().search(domain)
+        free_counts = {}
+        if products:
+            free_counts = request.env["bike.item"].sudo().get_free_item_counts(start, end, product_ids=products.ids)
+        quotes = products._get_rental_quotes(start, end)
+        return {
+            "start": fields.Datetime.to_string(start),
+            "end": fields.Datetime.to_string(end),
+            "products": [
+                {
+                    "id": product.id,
+                    "name": product.name,
+                    "category_id": product.category_id.id,
+                    "free_items": free_counts.get(product.id, 0),
+                    "price": quotes.get(product, (0.0, {}))[0],
+                    "price_detail": format_breakdown(quotes.get(product, (0.0, {}))[1]),
+                }
+                for product in products
+            ],
+        }
@@ -0,0 +1,43 @@
+import base64
+
+from werkzeug.exceptions import NotFound
+
+from odoo import http
+from odoo.http import request
+
+from ..models.image import IMAGE_VARIANTS
+
+# Le contenu d'une image partagée ne change jamais : mise en cache longue durée
+IMAGE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+class BikeImageController(http.Controller):
+
+    @http.route("/bike_manager/image/<int:image_id>/<string:variant>", type="http", auth="user", methods=["GET"])
+    def bike_image_variant(self, image_id, variant, **kwargs):
+        """Vignette pré-générée d'une image partagée, avec ETag et cache HTTP"""
+        if variant not in IMAGE_VARIANTS:
+            raise NotFound()
+        image = request.env["bike.image"].browse(image_id).exists()
+        if not image:
+            raise NotFound()
+
+        accept_webp = "image/webp" in request.httprequest.headers.get("Accept", "")
+        image_format = "webp" if accept_webp and image[f"variant_{variant}_webp"] else "jpeg"
+        etag = f'"{image.checksum}-{variant}-{image_format}"'
+        headers = [
+            ("Cache-Control", IMAGE_CACHE_CONTROL),
+            ("ETag", etag),
+            ("Vary", "Accept"),
+        ]
+        if etag in request.httprequest.headers.get("If-None-Match", ""):
+            return request.make_response(b"", headers=headers, status=304)
+
+        data, image_format = image._get_variant(variant, accept_webp=accept_webp)
+        if not data:
+            raise NotFound()
+        content = base64.b64decode(data)
+        return request.make_response(content, headers=headers + [
+            ("Content-Type", f"image/{image_format}"),
+            ("Content-Length", str(len(content))),
+        ])
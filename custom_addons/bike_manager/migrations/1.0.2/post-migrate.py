@@ -0,0 +1,28 @@
+"""
+Passage du stock produit au journal des mouvements : l'ancienne colonne
+stock_quantity de bike_product est reprise sous forme de mouvements « Stock
+initial », puis un premier instantané est créé.
+"""
+from odoo import api, fields, SUPERUSER_ID
+from odoo.tools.sql import column_exists
+
+
+def migrate(cr, version):
+    if not version or not column_exists(cr, "bike_product", "stock_quantity"):
+        return
+    cr.execute("SELECT 1 FROM bike_stock_move LIMIT 1")
+    if cr.fetchone():
+        return
+
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    cr.execute("SELECT id, stock_quantity FROM bike_product WHERE COALESCE(stock_quantity, 0) <> 0")
+    env["bike.stock.move"].create([
+        {
+            "product_id": product_id,
+            "quantity": quantity,
+            "move_type": "initial",
+            "note": "Reprise du stock existant",
+        }
+        for product_id, quantity in cr.fetchall()
+    ])
+    env["bike.stock.snapshot"]._take_snapshots(fields.Datetime.now())
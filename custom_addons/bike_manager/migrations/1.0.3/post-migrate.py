@@ -0,0 +1,43 @@
+"""
+Passage aux images partagées (bike.image) : les anciennes pièces jointes
+image_* des catégories, produits et vélos sont rattachées à l'image de même
+contenu, puis supprimées. Un vélo dont la photo est celle de son produit
+n'en garde pas de copie.
+"""
+import base64
+
+from odoo import api, SUPERUSER_ID
+
+IMAGE_FIELDS = ["image_1920", "image_1024", "image_512", "image_256", "image_128"]
+
+
+def migrate(cr, version):
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    Attachment = env["ir.attachment"].sudo()
+    Image = env["bike.image"]
+
+    # Catégories et produits d'abord : l'image de repli des vélos doit exister
+    for model in ("bike.category", "bike.product", "bike.item"):
+        attachments = Attachment.search([
+            ("res_model", "=", model),
+            ("res_field", "=", "image_1920"),
+        ])
+        for attachment in attachments:
+            record = env[model].with_context(active_test=False, bike_skip_image_check=True).browse(
+                attachment.res_id
+            ).exists()
+            if not record or record.image_id:
+                continue
+            image = Image._get_or_create(base64.b64encode(attachment.raw))
+            if model == "bike.item" and image == record.product_id.image_id:
+                continue
+            record.image_id = image
+            # Une image à la fois en mémoire
+            env.invalidate_all()
+
+        Attachment.search([
+            ("res_model", "=", model),
+            ("res_field", "in", IMAGE_FIELDS),
+        ]).unlink()
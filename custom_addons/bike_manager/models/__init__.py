@@ -1,7 +1,19 @@
+from . import accounting
+from . import sequence
+from . import image
 from . import bike_model
 from . import category
 from . import product
 from . import bike_item
 from . import customer
 from . import sale_order
+from . import sale_order_import
 from . import rental
+from . import rental_group
+from . import occupancy
+from . import stock
+from . import catalog_import
+from . import report
+from . import query_plan
+from . import benchmark
+from . import instrumentation
@@ -0,0 +1,128 @@
+from odoo import models, api, _
+from odoo.exceptions import ValidationError
+from odoo.tools import ormcache
+
+# Champs dont dépend la configuration comptable mise en cache
+JOURNAL_CONFIG_FIELDS = {"type", "company_id", "active", "sequence"}
+ACCOUNT_CONFIG_FIELDS = {"account_type", "internal_group", "active", "deprecated", "company_id", "company_ids"}
+TAX_CONFIG_FIELDS = {"type_tax_use", "amount", "active", "sequence", "company_id", "company_ids"}
+
+
+class BikeAccountingMixin(models.AbstractModel):
+    """
+    Configuration comptable des ventes et locations (journal, compte de revenu,
+    TVA 21%), résolue une fois par société puis gardée en cache.
+    Le cache est vidé dès qu'un journal, un compte ou une taxe change.
+    """
+    _name = "bike.accounting.mixin"
+    _description = "Configuration comptable Bike Shop"
+
+    @api.model
+    @ormcache("company_id")
+    def _get_accounting_config_ids(self, company_id):
+        """Retourne (journal de vente, compte de revenu, taxe 21%) en ids pour une société."""
+        journal = self.env["account.journal"].sudo().search([
+            ("type", "=", "sale"),
+            ("company_id", "=", company_id)
+        ], limit=1)
+
+        Account = self.env["account.account"].sudo()
+        domain = []
+
+        if "account_type" in Account._fields:
+            domain.append(("account_type", "=", "income"))
+        elif "internal_group" in Account._fields:
+            domain.append(("internal_group", "=", "income"))
+
+        if "active" in Account._fields:
+            domain.append(("active", "=", True))
+        if "deprecated" in Account._fields:
+            domain.append(("deprecated", "=", False))
+
+        if "company_id" in Account._fields:
+            domain.append(("company_id", "=", company_id))
+        elif "company_ids" in Account._fields:
+            domain.append(("company_ids", "in", company_id))
+
+        account = Account.search(domain, limit=1)
+
+        Tax = self.env["account.tax"].sudo()
+        domain = [("type_tax_use", "=", "sale"), ("amount", "=", 21)]
+
+        if "company_id" in Tax._fields:
+            domain.append(("company_id", "=", company_id))
+        elif "company_ids" in Tax._fields:
+            domain.append(("company_ids", "in", company_id))
+
+        tax = Tax.search(domain, limit=1)
+        return journal.id, account.id, tax.id
+
+    def _get_sale_journal(self):
+        journal_id = self._get_accounting_config_ids(self.env.company.id)[0]
+        if not journal_id:
+            raise ValidationError(_("Aucun journal de vente trouvé (type = sale)."))
+        return self.env["account.journal"].browse(journal_id)
+
+    def _get_income_account(self):
+        account_id = self._get_accounting_config_ids(self.env.company.id)[1]
+        if not account_id:
+            raise ValidationError(_("Aucun compte de revenu (income) trouvé."))
+        return self.env["account.account"].browse(account_id)
+
+    def _get_sale_tax_21(self):
+        tax_id = self._get_accounting_config_ids(self.env.company.id)[2]
+        return self.env["account.tax"].browse(tax_id)
+
+
+class AccountJournal(models.Model):
+    _inherit = "account.journal"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env.registry.clear_cache()
+        return super().create(vals_list)
+
+    def write(self, vals):
+        if JOURNAL_CONFIG_FIELDS.intersection(vals):
+            self.env.registry.clear_cache()
+        return super().write(vals)
+
+    def unlink(self):
+        self.env.registry.clear_cache()
+        return super().unlink()
+
+
+class AccountAccount(models.Model):
+    _inherit = "account.account"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env.registry.clear_cache()
+        return super().create(vals_list)
+
+    def write(self, vals):
+        if ACCOUNT_CONFIG_FIELDS.intersection(vals):
+            self.env.registry.clear_cache()
+        return super().write(vals)
+
+    def unlink(self):
+        self.env.registry.clear_cache()
+        return super().unlink()
+
+
+class AccountTax(models.Model):
+    _inherit = "account.tax"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env.registry.clear_cache()
+        return super().create(vals_list)
+
+    def write(self, vals):
+        if TAX_CONFIG_FIELDS.intersection(vals):
+            self.env.registry.clear_cache()
+        return super().write(vals)
+
+    def unlink(self):
+        self.env.registry.clear_cache()
+        return super().unlink()
@@ -0,0 +1,37 @@
+"""
+Génération du cache de disponibilité publique (/bike_manager/availability) :
+un compteur PostgreSQL (séquence) incrémenté après la validation de toute
+transaction qui modifie les locations, la flotte ou les tarifs. Une réponse
+mise en cache sous une génération antérieure n'est plus servie.
+"""
+
+AVAILABILITY_SEQUENCE = "bike_rental_availability_seq"
+
+
+def create_availability_sequence(cr):
+    cr.execute(f"CREATE SEQUENCE IF NOT EXISTS {AVAILABILITY_SEQUENCE}")
+
+
+def get_availability_generation(cr):
+    """Génération courante (lecture de la séquence, sans toucher aux tables de location)"""
+    # last_value vaut déjà 1 avant le premier nextval : is_called distingue les deux cas
+    cr.execute(f"SELECT last_value + is_called::int FROM {AVAILABILITY_SEQUENCE}")
+    return cr.fetchone()[0]
+
+
+def bump_availability_generation(env):
+    """
+    Incrémente la génération une fois la transaction validée (au plus une fois
+    par transaction) : un lecteur ne peut pas remettre en cache des données
+    antérieures à la modification sous la nouvelle génération.
+    """
+    postcommit = env.cr.postcommit
+    if postcommit.data.get(AVAILABILITY_SEQUENCE):
+        return
+    postcommit.data[AVAILABILITY_SEQUENCE] = True
+    registry = env.registry
+
+    @postcommit.add
+    def bump():
+        with registry.cursor() as cr:
+            cr.execute(f"SELECT nextval('{AVAILABILITY_SEQUENCE}')")
@@ -0,0 +1,384 @@
+import base64
+import io
+import json
+import logging
+import platform
+import random
+import time
+from datetime import datetime, timedelta
+
+from PIL import Image
+
+from odoo import models, fields, api, exceptions, release
+from odoo.tools import split_every
+
+_logger = logging.getLogger(__name__)
+
+# Volumes de référence (échelle 1.0)
+BENCHMARK_SIZES = {
+    "bike.category": 20,
+    "bike.model": 200,
+    "bike.product": 1000,
+    "bike.item": 10000,
+    "bike.customer": 50000,
+    "bike.rental": 500000,
+    "bike.sale.order": 50000,
+}
+BENCHMARK_MAX_LINES = 3
+BENCHMARK_BATCH_SIZE = 1000
+# Graine et date d'origine fixes : les mêmes données d'une version à l'autre
+BENCHMARK_SEED = 42
+BENCHMARK_EPOCH = datetime(2020, 1, 1, 8, 0)
+# Préfixe des numéros de série : repère une base déjà peuplée
+BENCHMARK_SERIAL_PREFIX = "BENCH-"
+# Contexte de peuplement : pas de suivi des modifications ni de message de création
+BENCHMARK_SEED_CONTEXT = {"tracking_disable": True, "mail_create_nolog": True, "mail_notrack": True}
+
+
+def _percentile(values, ratio):
+    """Percentile (rang le plus proche) d'une liste triée"""
+    return values[min(len(values) - 1, max(0, round(ratio * len(values)) - 1))]
+
+
+class BikeBenchmark(models.AbstractModel):
+    """
+    Banc d'essai du module : peuple une base dédiée avec une flotte synthétique
+    (modèles réels, volumes proportionnels à l'échelle) puis chronomètre les
+    opérations fréquentes. Le résultat JSON se compare d'une version à l'autre :
+
+        odoo-bin shell -d bench <<< "print(env['bike.benchmark']._run(scale=1.0)); env.cr.commit()" > bench.json
+
+    À ne jamais lancer sur une base de production.
+    """
+    _name = "bike.benchmark"
+    _description = "Banc d'essai des performances"
+
+    # -----------------------------
+    # POINT D'ENTRÉE
+    # -----------------------------
+    @api.model
+    def _run(self, scale=1.0, iterations=20):
+        """Peuple la base si nécessaire, mesure les opérations et retourne le rapport (JSON)"""
+        started = time.perf_counter()
+        seeding = self._seed(scale)
+        report = {
+            "odoo_version": release.version,
+            "module_version": self.env["ir.module.module"]._get("bike_manager").latest_version,
+            "python_version": platform.python_version(),
+            "date": fields.Datetime.to_string(fields.Datetime.now()),
+            "scale": scale,
+            "iterations": iterations,
+            "seed": BENCHMARK_SEED,
+            "seeding": seeding,
+            "rows": {model: self.env[model].with_context(active_test=False).search_count([]) for model in BENCHMARK_SIZES},
+            "timings": self._run_timings(iterations),
+        }
+        report["total_seconds"] = round(time.perf_counter() - started, 3)
+        _logger.info("Banc d'essai terminé en %ss", report["total_seconds"])
+        return json.dumps(report, indent=2, sort_keys=True)
+
+    # -----------------------------
+    # PEUPLEMENT
+    # -----------------------------
+    @api.model
+    def _seed(self, scale):
+        """
+        Crée les données synthétiques par lots (create multi), sauf si la base
+        est déjà peuplée. Retourne {modèle: {"count": n, "seconds": durée}}.
+        """
+        if self.env["bike.item"].with_context(active_test=False).search_count(
+            [("serial_number", "=like", f"{BENCHMARK_SERIAL_PREFIX}%")], limit=1
+        ):
+            _logger.info("Banc d'essai : base déjà peuplée, peuplement ignoré")
+            return {}
+        sizes = {model: max(1, int(size * scale)) for model, size in BENCHMARK_SIZES.items()}
+        rng = random.Random(BENCHMARK_SEED)
+        self = self.with_context(**BENCHMARK_SEED_CONTEXT)
+        seeding = {}
+        data = {}
+        for model, seed_method in (
+            ("bike.category", self._seed_categories),
+            ("bike.model", self._seed_bike_models),
+            ("bike.product", self._seed_products),
+            ("bike.item", self._seed_items),
+            ("bike.customer", self._seed_customers),
+            ("bike.rental", self._seed_rentals),
+            ("bike.sale.order", self._seed_sale_orders),
+        ):
+            started = time.perf_counter()
+            data[model] = seed_method(rng, sizes[model], data)
+            self.env.flush_all()
+            self.env.invalidate_all()
+            seeding[model] = {"count": len(data[model]), "seconds": round(time.perf_counter() - started, 3)}
+            _logger.info("Banc d'essai : %s %s créés en %ss", len(data[model]), model, seeding[model]["seconds"])
+
+        # Lectures de stock et rapports à jour, comme en production après les tâches planifiées
+        self.env["bike.stock.snapshot"]._take_snapshots(fields.Datetime.now())
+        self.env["bike.report.mixin"]._cron_refresh_reports()
+        return seeding
+
+    @api.model
+    def _create_batches(self, model, vals_list):
+        """Création par lots (liste ou générateur de valeurs) ; retourne la liste des ids"""
+        ids = []
+        for batch in split_every(BENCHMARK_BATCH_SIZE, vals_list, list):
+            ids += self.env[model].create(batch).ids
+            self.env.flush_all()
+            self.env.invalidate_all()
+        return ids
+
+    @api.model
+    def _seed_categories(self, rng, count, data):
+        return self._create_batches("bike.category", [
+            {"name": f"Catégorie {index:03d}"} for index in range(count)
+        ])
+
+    @api.model
+    def _seed_bike_models(self, rng, count, data):
+        return self._create_batches("bike.model", [
+            {
+                "name": f"Modèle {index:04d}",
+                "brand": rng.choice(["Giant", "Trek", "Canyon", "Specialized", "Orbea"]),
+                "category_id": rng.choice(data["bike.category"]),
+            }
+            for index in range(count)
+        ])
+
+    @api.model
+    def _seed_products(self, rng, count, data):
+        """80 % de vélos louables, le reste en accessoires ; une image partagée par tous"""
+        output = io.BytesIO()
+        Image.new("RGB", (64, 64), (40, 90, 160)).save(output, "PNG")
+        image = self.env["bike.image"]._get_or_create(base64.b64encode(output.getvalue()))
+        vals_list = []
+        for index in range(count):
+            daily = rng.randint(15, 60)
+            is_bike = index % 5 != 4
+            vals_list.append({
+                "name": f"Produit {index:05d}",
+                "product_type": "bike" if is_bike else "accessory",
+                "category_id": rng.choice(data["bike.category"]),
+                "bike_model_id": rng.choice(data["bike.model"]) if is_bike else False,
+                "sale_price": float(rng.randint(20, 3000)),
+                "cost_price": float(rng.randint(10, 1500)),
+                "can_be_rented": is_bike,
+                "rental_price_hourly": round(daily / 5.0, 2) if is_bike else 0.0,
+                "rental_price_daily": float(daily) if is_bike else 0.0,
+                "rental_price_weekly": float(daily * 5) if is_bike else 0.0,
+                "rental_price_monthly": float(daily * 15) if is_bike else 0.0,
+                "image_id": image.id,
+            })
+        product_ids = self._create_batches("bike.product", vals_list)
+        # Stock initial largement suffisant pour les commandes générées
+        self.env["bike.stock.move"]._register_moves([
+            {"product_id": product_id, "quantity": 1000000, "move_type": "initial", "date": BENCHMARK_EPOCH}
+            for product_id in product_ids
+        ])
+        return product_ids
+
+    @api.model
+    def _seed_items(self, rng, count, data):
+        products = self.env["bike.product"].browse(data["bike.product"])
+        bike_ids = products.filtered(lambda p: p.product_type == "bike").ids
+        return self._create_batches("bike.item", [
+            {
+                "serial_number": f"{BENCHMARK_SERIAL_PREFIX}{index:07d}",
+                "product_id": rng.choice(bike_ids),
+                "usage_type": "both" if index % 10 == 0 else "rental",
+            }
+            for index in range(count)
+        ])
+
+    @api.model
+    def _seed_customers(self, rng, count, data):
+        country = self.env.ref("base.be")
+        return self._create_batches("bike.customer", [
+            {
+                "first_name": f"Prénom{index}",
+                "last_name": f"Nom{index}",
+                "email": f"client{index}@bench.example.com",
+                "phone": f"+32 470 {index // 1000:03d} {index % 1000:03d}",
+                "street": f"Rue du Banc {index % 500 + 1}",
+                "zip": f"{1000 + index % 8999:04d}",
+                "city": "Bruxelles",
+                "country_id": country.id,
+            }
+            for index in range(count)
+        ])
+
+    @api.model
+    def _seed_rentals(self, rng, count, data):
+        """Locations retournées, successives sans chevauchement sur chaque vélo, à partir de l'origine fixe"""
+        item_ids = data["bike.item"]
+        items = {
+            item.id: item.product_id.rental_price_daily
+            for item in self.env["bike.item"].browse(item_ids)
+        }
+        per_item, extra = divmod(count, len(item_ids))
+
+        # Valeurs générées au fil des lots (pas de liste de toutes les locations en mémoire)
+        def iter_vals():
+            for position, item_id in enumerate(item_ids):
+                start = BENCHMARK_EPOCH
+                for _index in range(per_item + (1 if position < extra else 0)):
+                    start += timedelta(days=rng.randint(0, 4), hours=rng.randint(0, 8))
+                    days = rng.randint(1, 3)
+                    end = start + timedelta(days=days)
+                    yield {
+                        "customer_id": rng.choice(data["bike.customer"]),
+                        "bike_item_id": item_id,
+                        "start_date": start,
+                        "end_date": end,
+                        "pricing_type": "daily",
+                        "days_qty": str(days),
+                        "unit_price": items[item_id],
+                        "state": "returned",
+                        "is_paid": True,
+                    }
+                    start = end
+
+        return self._create_batches("bike.rental", iter_vals())
+
+    @api.model
+    def _seed_sale_orders(self, rng, count, data):
+        """Commandes confirmées par lots (mouvements de stock compris)"""
+        prices = {
+            product.id: product.sale_price
+            for product in self.env["bike.product"].browse(data["bike.product"])
+        }
+        product_ids = list(prices)
+        order_ids = []
+        for batch in split_every(BENCHMARK_BATCH_SIZE, range(count), list):
+            orders = self.env["bike.sale.order"].create([
+                {
+                    "customer_id": rng.choice(data["bike.customer"]),
+                    "date": BENCHMARK_EPOCH + timedelta(minutes=rng.randint(0, 60 * 24 * 365 * 3)),
+                    "channel": rng.choice(["shop", "web", "phone"]),
+                    "order_line_ids": [
+                        fields.Command.create({
+                            "product_id": product_id,
+                            "quantity": rng.randint(1, 3),
+                            "unit_price": prices[product_id],
+                        })
+                        for product_id in rng.sample(product_ids, rng.randint(1, BENCHMARK_MAX_LINES))
+                    ],
+                }
+                for _index in batch
+            ])
+            orders.action_confirm()
+            order_ids += orders.ids
+            self.env.flush_all()
+            self.env.invalidate_all()
+        return order_ids
+
+    # -----------------------------
+    # MESURES
+    # -----------------------------
+    @api.model
+    def _measure(self, operation, iterations, setup=None):
+        """
+        Exécute operation(argument) iterations fois ; le temps et le nombre de
+        requêtes SQL incluent l'écriture en base (flush), pas la préparation.
+        """
+        durations = []
+        queries = []
+        cr = self.env.cr
+        for index in range(iterations):
+            argument = setup(index) if setup else index
+            self.env.flush_all()
+            self.env.invalidate_all()
+            query_count = cr.sql_log_count
+            started = time.perf_counter()
+            operation(argument)
+            self.env.flush_all()
+            durations.append((time.perf_counter() - started) * 1000.0)
+            queries.append(cr.sql_log_count - query_count)
+        durations.sort()
+        queries.sort()
+        return {
+            "runs": iterations,
+            "min_ms": round(durations[0], 3),
+            "median_ms": round(_percentile(durations, 0.5), 3),
+            "p95_ms": round(_percentile(durations, 0.95), 3),
+            "max_ms": round(durations[-1], 3),
+            "median_queries": _percentile(queries, 0.5),
+        }
+
+    @api.model
+    def _run_timings(self, iterations):
+        """Chronomètre les opérations fréquentes sur des données créées pour l'occasion"""
+        Rental = self.env["bike.rental"]
+        items = self.env["bike.item"].search([
+            ("serial_number", "=like", f"{BENCHMARK_SERIAL_PREFIX}%"),
+            ("usage_type", "in", ["rental", "both"]),
+            ("status", "=", "available"),
+        ], limit=iterations)
+        customers = self.env["bike.customer"].search([], limit=iterations)
+        products = self.env["bike.product"].search([("product_type", "=", "accessory")], limit=BENCHMARK_MAX_LINES)
+        if len(items) < iterations or not customers or not products:
+            raise exceptions.UserError("Données insuffisantes pour le banc d'essai : lancer le peuplement d'abord.")
+        # Période future, libre sur tous les vélos peuplés
+        start = fields.Datetime.now().replace(microsecond=0) + timedelta(days=30)
+        rentals = []
+
+        def create_rental(index):
+            item = items[index]
+            rentals.append(Rental.create({
+                "customer_id": customers[index % len(customers)].id,
+                "bike_item_id": item.id,
+                "start_date": start,
+                "pricing_type": "daily",
+                "days_qty": "2",
+                "unit_price": item.product_id.rental_price_daily,
+            }))
+
+        def create_orders(index):
+            return self.env["bike.sale.order"].create({
+                "customer_id": customers[index % len(customers)].id,
+                "order_line_ids": [
+                    fields.Command.create({"product_id": product.id, "quantity": 1, "unit_price": product.sale_price})
+                    for product in products
+                ],
+            })
+
+        timings = {
+            "rental_create": self._measure(create_rental, iterations),
+            "rental_start": self._measure(lambda index: rentals[index].action_start_rental(), iterations),
+            "rental_return": self._measure(lambda index: rentals[index].action_return_bike(), iterations),
+            "sale_order_confirm": self._measure(lambda order: order.action_confirm(), iterations, setup=create_orders),
+        }
+        try:
+            timings["rental_invoice"] = self._measure(
+                lambda index: rentals[index].action_create_invoice(), iterations
+            )
+        except exceptions.ValidationError as e:
+            # Comptabilité non configurée sur la base de test
+            timings["rental_invoice"] = {"skipped": str(e)}
+
+        # Lectures des vues (80 enregistrements, comme le client web)
+        reads = {
+            "kanban_bike_item": ("bike.item", {
+                "name": {}, "serial_number": {}, "status": {}, "image_kanban_url": {},
+                "product_id": {"fields": {"display_name": {}}},
+            }),
+            "list_bike_rental": ("bike.rental", {
+                "name": {}, "start_date": {}, "end_date": {}, "state": {}, "total_amount": {},
+                "customer_id": {"fields": {"display_name": {}}},
+                "bike_item_id": {"fields": {"display_name": {}}},
+            }),
+            "list_bike_customer": ("bike.customer", {
+                "name": {}, "email": {}, "phone": {}, "city": {}, "rental_count": {}, "sale_count": {},
+            }),
+            "kanban_bike_product": ("bike.product", {
+                "name": {}, "reference": {}, "sale_price": {}, "stock_quantity": {},
+                "available_quantity": {}, "image_kanban_url": {},
+            }),
+        }
+        for name, (model, specification) in reads.items():
+            timings[name] = self._measure(
+                lambda index, model=model, specification=specification: self.env[model].web_search_read(
+                    [], specification, limit=80,
+                ),
+                iterations,
+            )
+        return timings
@@ -1,4 +1,15 @@
+from datetime import timedelta
+
 from odoo import models, fields, api, exceptions, _
+from odoo.tools import split_every
+
+from .availability import bump_availability_generation
+from .importing import IMPORT_CHUNK_SIZE, to_float, to_selection
+from .rental import BLOCKING_STATES, _period_sql
+
+
+# Champs du vélo dont dépend la disponibilité publique
+AVAILABILITY_FIELDS = {"product_id", "usage_type", "status", "active"}
 
 
 class BikeItem(models.Model):
@@ -9,7 +20,7 @@ class BikeItem(models.Model):
     _name = "bike.item"
     _description = "Vélo individuel"
     _order = "serial_number"
-    _inherit = ["image.mixin", "mail.thread", "mail.activity.mixin"]
+    _inherit = ["bike.image.holder", "mail.thread", "mail.activity.mixin"]
 
     # Identification unique
     name = fields.Char(
@@ -31,6 +42,7 @@ class BikeItem(models.Model):
         string="Modèle de vélo",
         required=True,
         ondelete="restrict",
+        index=True,
         domain="[('product_type', '=', 'bike')]",
         help="Le modèle de vélo (ex: VTT Giant Talon 2024)"
     )
@@ -52,8 +64,6 @@ class BikeItem(models.Model):
     # Image spécifique (sinon hérite du produit)
     image_1920 = fields.Image(
         string="Image du vélo",
-        max_width=1920,
-        max_height=1920,
         help="Photo de ce vélo spécifique (optionnel, sinon utilise l'image du modèle)"
     )
 
@@ -140,22 +150,61 @@ class BikeItem(models.Model):
     # Statistiques
     rental_count = fields.Integer(
         string="Nombre de locations",
-        compute="_compute_rental_count",
+        compute="_compute_rental_stats",
         store=True,
         help="Nombre total de fois que ce vélo a été loué"
     )
     total_rental_revenue = fields.Float(
         string="Revenu total (location)",
-        compute="_compute_total_rental_revenue",
+        compute="_compute_rental_stats",
+        store=True,
         help="Revenu total généré par la location de ce vélo"
     )
+    last_rental_date = fields.Datetime(
+        string="Dernière location",
+        compute="_compute_rental_stats",
+        store=True,
+        help="Date de début de la location la plus récente (en cours ou terminée)"
+    )
+    occupancy_rate = fields.Float(
+        string="Taux d'occupation (%)",
+        compute="_compute_occupancy_rate",
+        help="Part du temps réservé sur la période demandée (par défaut les 30 derniers jours)"
+    )
 
     active = fields.Boolean(string="Actif", default=True)
 
-    _sql_constraints = [
-        ('serial_number_unique', 'unique(serial_number)',
-         'Le numéro de série doit être unique !')
-    ]
+    # Index unique : sert aussi la recherche d'un vélo par numéro de série
+    _serial_number_unique = models.Constraint('unique(serial_number)', 'Le numéro de série doit être unique !')
+
+    def _get_fallback_image(self):
+        """Sans photo propre, le vélo affiche l'image du produit (sans la copier)"""
+        return self.product_id.image_id
+
+    @api.depends('image_id', 'product_id.image_id')
+    def _compute_images(self):
+        super()._compute_images()
+
+    @api.depends('image_id', 'product_id.image_id')
+    def _compute_image_urls(self):
+        super()._compute_image_urls()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        items = super().create(vals_list)
+        bump_availability_generation(self.env)
+        return items
+
+    def write(self, vals):
+        res = super().write(vals)
+        if AVAILABILITY_FIELDS.intersection(vals):
+            bump_availability_generation(self.env)
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        bump_availability_generation(self.env)
+        return res
 
     @api.depends('product_id', 'serial_number')
     def _compute_name(self):
@@ -175,57 +224,109 @@ class BikeItem(models.Model):
             if not item.sale_price and item.product_id:
                 item.sale_price = item.product_id.sale_price
 
-    @api.depends('rental_ids', 'rental_ids.state', 'usage_type', 'condition')
+    def _get_active_rental_states(self):
+        """
+        États des locations actives (brouillon / en cours) par vélo, en une
+        requête groupée : l'historique des locations terminées n'est jamais chargé.
+        """
+        items = self.filtered('id')
+        if not items:
+            return {}
+        result = {}
+        for item, state in self.env['bike.rental']._read_group(
+            [('bike_item_id', 'in', items.ids), ('state', 'in', list(BLOCKING_STATES))],
+            ['bike_item_id', 'state'],
+        ):
+            result.setdefault(item.id, set()).add(state)
+        return result
+
+    def _get_expected_status(self, rental_states):
+        """Statut attendu d'après les locations actives et l'état physique"""
+        self.ensure_one()
+        # Si vendu, toujours vendu
+        if self.status == 'sold':
+            return 'sold'
+        states = rental_states.get(self.id, ())
+        if 'ongoing' in states:
+            return 'rented'
+        if 'draft' in states:
+            return 'reserved'
+        if self.condition == 'poor':
+            return 'maintenance'
+        # Si aucune location active et condition OK, remettre en disponible
+        return 'available'
+
+    @api.depends('usage_type', 'condition')
     def _compute_status(self):
         """Calcule le statut en fonction des locations actives et de l'état physique"""
+        rental_states = self._get_active_rental_states()
         for item in self:
-            # Si vendu, toujours vendu
-            if item.status == 'sold':
-                continue
+            item.status = item._get_expected_status(rental_states)
 
-            # Vérifie s'il y a une location active
-            active_rental = item.rental_ids.filtered(
-                lambda r: r.state == 'ongoing'
-            )
-            reserved_rental = item.rental_ids.filtered(
-                lambda r: r.state == 'draft'
-            )
-
-            if active_rental:
-                item.status = 'rented'
-            elif reserved_rental:
-                item.status = 'reserved'
-            elif item.condition == 'poor':
-                item.status = 'maintenance'
-            else:
-                # Si aucune location active et condition OK, remettre en disponible
-                item.status = 'available'
+    def _sync_rental_status(self):
+        """
+        Met à jour le statut après un changement d'état de location : une
+        requête sur les locations actives, puis une écriture par statut, et
+        seulement pour les vélos dont le statut change (pas de suivi inutile).
+        """
+        items = self.exists()
+        rental_states = items._get_active_rental_states()
+        by_status = {}
+        for item in items:
+            expected = item._get_expected_status(rental_states)
+            if item.status != expected:
+                by_status.setdefault(expected, []).append(item.id)
+        for status, item_ids in by_status.items():
+            self.browse(item_ids).write({'status': status})
 
-    @api.depends('rental_ids')
+    @api.depends('rental_ids', 'rental_ids.state')
     def _compute_current_rental(self):
-        """Trouve la location en cours"""
+        """Trouve la location en cours (une recherche pour tout le lot)"""
+        items = self.filtered('id')
+        current = {}
+        if items:
+            for rental in self.env['bike.rental'].search([
+                ('bike_item_id', 'in', items.ids),
+                ('state', '=', 'ongoing'),
+            ]):
+                current.setdefault(rental.bike_item_id.id, rental)
         for item in self:
-            current = item.rental_ids.filtered(
-                lambda r: r.state == 'ongoing'
-            )
-            item.current_rental_id = current[0] if current else False
+            item.current_rental_id = current.get(item.id, False)
 
-    @api.depends('rental_ids', 'rental_ids.state')
-    def _compute_rental_count(self):
-        """Compte le nombre de locations terminées"""
+    @api.depends('rental_ids', 'rental_ids.state', 'rental_ids.total_price', 'rental_ids.start_date')
+    def _compute_rental_stats(self):
+        """
+        Statistiques de location de tout le lot en une agrégation groupée :
+        nombre et revenu des locations terminées, date de la dernière location.
+        """
+        items = self.filtered('id')
+        stats = {}
+        if items:
+            for item, state, count, revenue, last_date in self.env['bike.rental']._read_group(
+                [('bike_item_id', 'in', items.ids), ('state', 'in', ['ongoing', 'returned'])],
+                ['bike_item_id', 'state'],
+                ['__count', 'total_price:sum', 'start_date:max'],
+            ):
+                item_stats = stats.setdefault(item.id, {'count': 0, 'revenue': 0.0, 'last': False})
+                if state == 'returned':
+                    item_stats['count'] = count
+                    item_stats['revenue'] = revenue
+                if not item_stats['last'] or (last_date and last_date > item_stats['last']):
+                    item_stats['last'] = last_date
         for item in self:
-            item.rental_count = len(item.rental_ids.filtered(
-                lambda r: r.state == 'returned'
-            ))
+            item_stats = stats.get(item.id, {'count': 0, 'revenue': 0.0, 'last': False})
+            item.rental_count = item_stats['count']
+            item.total_rental_revenue = item_stats['revenue']
+            item.last_rental_date = item_stats['last']
 
-    @api.depends('rental_ids', 'rental_ids.total_price', 'rental_ids.state')
-    def _compute_total_rental_revenue(self):
-        """Calcule le revenu total de location"""
+    def _compute_occupancy_rate(self):
+        """Taux d'occupation de tous les vélos en une seule agrégation"""
+        Occupancy = self.env['bike.item.occupancy']
+        date_from, date_to = Occupancy._get_context_dates()
+        items = self.filtered('id')
+        rates = Occupancy._get_occupancy_rates(date_from, date_to, item_ids=items.ids) if items else {}
         for item in self:
-            completed = item.rental_ids.filtered(
-                lambda r: r.state == 'returned'
-            )
-            item.total_rental_revenue = sum(completed.mapped('total_price'))
+            item.occupancy_rate = rates.get(item.id, 0.0)
 
     @api.constrains('usage_type', 'status')
     def _check_usage_status(self):
@@ -236,6 +337,101 @@ class BikeItem(models.Model):
                     "Un vélo destiné uniquement à la vente ne peut pas être loué !"
                 ))
 
+    # -----------------------------
+    # DISPONIBILITÉ SUR UNE PÉRIODE
+    # -----------------------------
+    @api.model
+    def _query_free_items(self, start, end, product_ids=None, category_ids=None,
+                          bike_model_ids=None, exclude_rental_ids=None):
+        """
+        Vélos louables libres sur [start, end) : une seule requête pour toute la
+        flotte, les chevauchements étant résolus par l'index GiST des locations.
+        Retourne une liste de tuples (id du vélo, id du produit).
+        """
+        start = fields.Datetime.to_datetime(start)
+        end = fields.Datetime.to_datetime(end)
+        if not start or not end or end <= start:
+            return []
+
+        query = self._get_free_items_query(
+            start, end, product_ids, category_ids, bike_model_ids, exclude_rental_ids
+        )
+        if query is None:
+            return []
+        self.flush_model(["active", "usage_type", "status", "product_id", "category_id", "bike_model_id"])
+        self.env["bike.rental"].flush_model(["bike_item_id", "start_date", "end_date", "state", "active"])
+        self.env.cr.execute(*query)
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _get_free_items_query(self, start, end, product_ids=None, category_ids=None,
+                              bike_model_ids=None, exclude_rental_ids=None):
+        """Requête SQL et paramètres de _query_free_items (None si aucun vélo ne peut correspondre)"""
+        filters = []
+        params = [BLOCKING_STATES, start, end]
+        if exclude_rental_ids:
+            filters.append("AND r.id NOT IN %s")
+            params.append(tuple(exclude_rental_ids))
+        rental_filters = " ".join(filters)
+
+        filters = []
+        for column, ids in (
+            ("product_id", product_ids),
+            ("category_id", category_ids),
+            ("bike_model_id", bike_model_ids),
+        ):
+            if ids is not None:
+                if not ids:
+                    return None
+                filters.append(f"AND i.{column} IN %s")
+                params.append(tuple(ids))
+        item_filters = " ".join(filters)
+
+        return f"""
+            SELECT i.id, i.product_id
+              FROM bike_item i
+             WHERE i.active
+               AND i.usage_type IN ('rental', 'both')
+               AND i.status NOT IN ('maintenance', 'sold')
+               AND NOT EXISTS (
+                    SELECT 1
+                      FROM bike_rental r
+                     WHERE r.bike_item_id = i.id
+                       AND r.state IN %s
+                       AND r.active
+                       AND {_period_sql("r")} && tsrange(%s, %s, '[)')
+                       {rental_filters}
+               )
+               {item_filters}
+          ORDER BY i.serial_number
+        """, params
+
+    @api.model
+    def _get_free_items(self, start, end, product_ids=None, category_ids=None,
+                        bike_model_ids=None, exclude_rental_ids=None):
+        """Recordset des vélos libres sur la période (voir _query_free_items)."""
+        rows = self._query_free_items(
+            start, end, product_ids, category_ids, bike_model_ids, exclude_rental_ids
+        )
+        return self.browse([item_id for item_id, _product_id in rows])
+
+    @api.model
+    def get_free_item_counts(self, start, end, product_ids=None, category_ids=None, bike_model_ids=None):
+        """Nombre de vélos libres par produit sur la période : {product_id: nombre}."""
+        counts = {}
+        for _item_id, product_id in self._query_free_items(
+            start, end, product_ids, category_ids, bike_model_ids
+        ):
+            counts[product_id] = counts.get(product_id, 0) + 1
+        return counts
+
+    @api.model
+    def _get_context_period(self):
+        """Période demandée via le contexte (bike_period_start / bike_period_end), par défaut les prochaines 24h."""
+        start = fields.Datetime.to_datetime(self.env.context.get("bike_period_start")) or fields.Datetime.now()
+        end = fields.Datetime.to_datetime(self.env.context.get("bike_period_end")) or start + timedelta(days=1)
+        return start, end
+
     def action_mark_as_sold(self):
         """Marque le vélo comme vendu"""
         for item in self:
@@ -278,3 +474,80 @@ class BikeItem(models.Model):
             'domain': [('bike_item_id', '=', self.id)],
             'context': {'default_bike_item_id': self.id},
         }
+
+    # ----------------------------
+    # Import du catalogue fournisseur (vélos numérotés)
+    # ----------------------------
+    @api.model
+    def _import_item_stream(self, rows, chunk_size=IMPORT_CHUNK_SIZE):
+        """
+        Importe des vélos individuels depuis un flux de lignes.
+
+        Colonnes : serial_number, product_reference, usage_type, condition,
+        purchase_price, purchase_date, sale_price, location.
+
+        Les vélos sont créés par paquets, sans suivi de messages (chatter), les
+        numéros de série déjà connus sont ignorés.
+        Retourne {'created': n, 'skipped': n, 'errors': [messages]}.
+        """
+        result = {'created': 0, 'skipped': 0, 'errors': []}
+        items = self.with_context(
+            active_test=False,
+            tracking_disable=True,
+            mail_create_nolog=True,
+            mail_create_nosubscribe=True,
+        )
+        for chunk in split_every(chunk_size, rows, list):
+            items._import_item_chunk(chunk, result)
+        return result
+
+    @api.model
+    def _import_item_chunk(self, chunk, result):
+        """Crée un paquet de vélos : produits et numéros existants résolus en une requête chacun"""
+        serials = [row.get('serial_number') for row in chunk if row.get('serial_number')]
+        existing = set(self.search([('serial_number', 'in', serials)]).mapped('serial_number'))
+        products = {
+            product.reference: product.id
+            for product in self.env['bike.product'].search([
+                ('reference', 'in', [row.get('product_reference') for row in chunk if row.get('product_reference')]),
+            ])
+        }
+
+        vals_list = []
+        for row in chunk:
+            serial = row.get('serial_number')
+            if not serial:
+                result['errors'].append(_("Vélo sans numéro de série ignoré"))
+                continue
+            if serial in existing:
+                result['skipped'] += 1
+                continue
+            product_id = products.get(row.get('product_reference'))
+            if not product_id:
+                result['errors'].append(_("%(serial)s : produit inconnu (%(product)s)") % {
+                    'serial': serial, 'product': row.get('product_reference') or '',
+                })
+                continue
+            try:
+                vals = {
+                    'serial_number': serial,
+                    'product_id': product_id,
+                    'usage_type': to_selection(row.get('usage_type'), self._fields['usage_type'], self.env, 'rental'),
+                    'condition': to_selection(row.get('condition'), self._fields['condition'], self.env, 'excellent'),
+                    'purchase_price': to_float(row.get('purchase_price')),
+                    'location': row.get('location') or False,
+                }
+                if row.get('purchase_date'):
+                    vals['purchase_date'] = fields.Date.to_date(row['purchase_date'])
+                if row.get('sale_price') not in (None, ''):
+                    vals['sale_price'] = to_float(row['sale_price'])
+            except ValueError as e:
+                result['errors'].append(_("%(serial)s : %(error)s") % {'serial': serial, 'error': e})
+                continue
+            vals_list.append(vals)
+            existing.add(serial)
+
+        self.create(vals_list)
+        result['created'] += len(vals_list)
+        self.env.flush_all()
+        self.env.invalidate_all()
@@ -36,5 +36,14 @@ class BikeModel(models.Model):
 
     @api.depends("product_ids", "product_ids.active")
     def _compute_product_count(self):
+        """Nombre de produits actifs de tout le lot en une requête groupée"""
+        counts = {}
+        if self.ids:
+            counts = {
+                bike_model.id: count
+                for bike_model, count in self.env["bike.product"]._read_group(
+                    [("bike_model_id", "in", self.ids)], ["bike_model_id"], ["__count"]
+                )
+            }
         for model in self:
-            model.product_count = len(model.product_ids.filtered(lambda p: p.active))
+            model.product_count = counts.get(model.id, 0)
@@ -0,0 +1,57 @@
+from odoo import models, fields, _
+
+from .importing import IMPORT_CHUNK_SIZE, IMPORT_FORMATS, guess_format, iter_rows, open_binary_field
+
+
+class BikeCatalogImport(models.TransientModel):
+    """
+    Assistant d'import d'un catalogue fournisseur : produits puis vélos numérotés
+    """
+    _name = "bike.catalog.import"
+    _description = "Import de catalogue"
+
+    product_file = fields.Binary(string="Fichier produits")
+    product_filename = fields.Char(string="Nom du fichier produits")
+    item_file = fields.Binary(string="Fichier vélos individuels")
+    item_filename = fields.Char(string="Nom du fichier vélos")
+    file_format = fields.Selection(IMPORT_FORMATS, string="Format",
+                                   help="Déduit de l'extension des fichiers si non renseigné")
+    image_dir = fields.Char(string="Dossier des images",
+                            help="Dossier du serveur contenant les images citées dans la colonne « image »")
+    chunk_size = fields.Integer(string="Enregistrements par paquet", default=IMPORT_CHUNK_SIZE)
+
+    def _read_file(self, data, filename):
+        return iter_rows(open_binary_field(data), self.file_format or guess_format(filename))
+
+    def action_import(self):
+        self.ensure_one()
+        chunk_size = max(self.chunk_size, 1)
+        lines = []
+        errors = []
+        if self.product_file:
+            result = self.env['bike.product']._import_product_stream(
+                self._read_file(self.product_file, self.product_filename), self.image_dir, chunk_size=chunk_size
+            )
+            lines.append(_("%(created)s produit(s) importé(s), %(skipped)s déjà présent(s).") % result)
+            errors += result['errors']
+        if self.item_file:
+            result = self.env['bike.item']._import_item_stream(
+                self._read_file(self.item_file, self.item_filename), chunk_size=chunk_size
+            )
+            lines.append(_("%(created)s vélo(s) importé(s), %(skipped)s déjà présent(s).") % result)
+            errors += result['errors']
+
+        message = "\n".join(lines + errors[:20]) or _("Aucun fichier à importer.")
+        if len(errors) > 20:
+            message += "\n" + _("… et %s autre(s) erreur(s)") % (len(errors) - 20)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Import du catalogue"),
+                'message': message,
+                'type': 'warning' if errors else 'success',
+                'sticky': bool(errors),
+                'next': {'type': 'ir.actions.act_window_close'},
+            },
+        }
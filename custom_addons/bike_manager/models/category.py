@@ -1,5 +1,4 @@
 from odoo import models, fields, api
-import base64
 import os
 
 
@@ -10,7 +9,7 @@ class BikeCategory(models.Model):
     _name = "bike.category"
     _description = "Catégorie"
     _order = "name"
-    _inherit = ["image.mixin"]
+    _inherit = ["bike.image.holder"]
 
     name = fields.Char(string="Nom de la catégorie", required=True)
     description = fields.Text(string="Description")
@@ -21,8 +20,17 @@ class BikeCategory(models.Model):
 
     @api.depends("product_ids", "product_ids.active")
     def _compute_product_count(self):
+        """Nombre de produits actifs de tout le lot en une requête groupée"""
+        counts = {}
+        if self.ids:
+            counts = {
+                category.id: count
+                for category, count in self.env["bike.product"]._read_group(
+                    [("category_id", "in", self.ids)], ["category_id"], ["__count"]
+                )
+            }
         for cat in self:
-            cat.product_count = len(cat.product_ids.filtered(lambda p: p.active))
+            cat.product_count = counts.get(cat.id, 0)
 
     def action_view_products(self):
         """Ouvre la vue des vélos de cette catégorie"""
@@ -51,9 +59,8 @@ class BikeCategory(models.Model):
 
         for category_name, image_file in category_images.items():
             category = self.search([('name', '=', category_name)], limit=1)
-            if category and not category.image_1920:
+            if category and not category.image_id:
                 image_path = os.path.join(img_path, image_file)
                 if os.path.exists(image_path):
-                    with open(image_path, 'rb') as f:
-                        image_data = base64.b64encode(f.read()).decode('utf-8')
-                        category.write({'image_1920': image_data})
+                    # Empreinte calculée en flux, image partagée si déjà connue
+                    category.image_id = self.env['bike.image']._get_or_create_from_file(image_path)
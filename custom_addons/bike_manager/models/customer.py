@@ -3,7 +3,17 @@ import re
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
-from odoo.tools import email_normalize
+from odoo.tools import email_normalize, float_is_zero
+
+# États comptés dans les statistiques client
+COUNTED_SALE_STATES = ("confirmed", "done")
+COUNTED_RENTAL_STATES = ("ongoing", "returned")
+
+# Colonnes (nombre, montant) de bike.customer par type de document
+STAT_COLUMNS = {
+    "sale": ("sale_count", "total_sales_amount"),
+    "rental": ("rental_count", "total_rental_amount"),
+}
 
 
 class BikeCustomer(models.Model):
@@ -23,7 +33,7 @@ class BikeCustomer(models.Model):
     # ----------------------------
     # Coordonnées
     # ----------------------------
-    email = fields.Char(string="E-mail")
+    email = fields.Char(string="E-mail", index=True)
     phone = fields.Char(string="Téléphone")
     mobile = fields.Char(string="GSM")
 
@@ -46,10 +56,11 @@ class BikeCustomer(models.Model):
     # ----------------------------
     # Statistiques
     # ----------------------------
-    sale_count = fields.Integer(string="Nombre de ventes", compute="_compute_stats", store=True)
-    rental_count = fields.Integer(string="Nombre de locations", compute="_compute_stats", store=True)
-    total_sales_amount = fields.Float(string="Total ventes", compute="_compute_stats", store=True)
-    total_rental_amount = fields.Float(string="Total locations", compute="_compute_stats", store=True)
+    # Tenues à jour par deltas (voir _apply_stat_changes), reconstruites par _rebuild_stats
+    sale_count = fields.Integer(string="Nombre de ventes", default=0, readonly=True, copy=False)
+    rental_count = fields.Integer(string="Nombre de locations", default=0, readonly=True, copy=False)
+    total_sales_amount = fields.Float(string="Total ventes", default=0.0, readonly=True, copy=False)
+    total_rental_amount = fields.Float(string="Total locations", default=0.0, readonly=True, copy=False)
 
     # ----------------------------
     # Facturation / lien res.partner (optionnel)
@@ -184,21 +195,78 @@ class BikeCustomer(models.Model):
                     rec.email = normalized
 
     # ----------------------------
-    # Stats computation
+    # Stats (deltas)
     # ----------------------------
-    @api.depends(
-        "sale_order_ids", "sale_order_ids.state", "sale_order_ids.total_amount",
-        "rental_ids", "rental_ids.state", "rental_ids.total_amount"
-    )
-    def _compute_stats(self):
-        for customer in self:
-            confirmed_sales = customer.sale_order_ids.filtered(lambda s: s.state in ["confirmed", "done"])
-            confirmed_rentals = customer.rental_ids.filtered(lambda r: r.state in ["ongoing", "returned", "done"])
+    @api.model
+    def _apply_stat_changes(self, kind, before, after):
+        """
+        Applique la différence entre deux photos des contributions d'un document
+        (kind = 'sale' ou 'rental') aux statistiques de ses clients.
+        before / after : {id du document: (id client, nombre, montant)}
+        """
+        deltas = {}
+        for sign, snapshot in ((-1, before), (1, after)):
+            for customer_id, count, amount in snapshot.values():
+                if customer_id and (count or amount):
+                    delta = deltas.setdefault(customer_id, [0, 0.0])
+                    delta[0] += sign * count
+                    delta[1] += sign * amount
+        self._add_stats(kind, {
+            customer_id: (count, amount)
+            for customer_id, (count, amount) in deltas.items()
+            if count or not float_is_zero(amount, precision_digits=2)
+        })
+
+    @api.model
+    def _add_stats(self, kind, deltas):
+        """Ajoute {id client: (nombre, montant)} en une seule requête UPDATE atomique."""
+        if not deltas:
+            return
+        count_column, amount_column = STAT_COLUMNS[kind]
+        values = ", ".join(["(%s, %s, %s::float8)"] * len(deltas))
+        params = [v for customer_id, (count, amount) in deltas.items() for v in (customer_id, count, amount)]
+        self.flush_model([count_column, amount_column])
+        self.env.cr.execute(f"""
+            UPDATE bike_customer c
+               SET {count_column} = COALESCE(c.{count_column}, 0) + v.count,
+                   {amount_column} = COALESCE(c.{amount_column}, 0.0) + v.amount
+              FROM (VALUES {values}) AS v(id, count, amount)
+             WHERE c.id = v.id
+        """, params)
+        self.browse(list(deltas)).invalidate_recordset([count_column, amount_column])
+
+    def _rebuild_stats(self):
+        """Recalcule les statistiques depuis l'historique complet (rattrapage), en une requête."""
+        self.env["bike.sale.order"].flush_model(["customer_id", "state", "active", "total_amount"])
+        self.env["bike.rental"].flush_model(["customer_id", "state", "active", "total_amount"])
+        customer_filter = "AND c.id IN %(ids)s" if self else ""
+        self.env.cr.execute(f"""
+            UPDATE bike_customer c
+               SET sale_count = COALESCE(s.count, 0),
+                   total_sales_amount = COALESCE(s.amount, 0.0),
+                   rental_count = COALESCE(r.count, 0),
+                   total_rental_amount = COALESCE(r.amount, 0.0)
+              FROM bike_customer c2
+         LEFT JOIN (SELECT customer_id, COUNT(*) AS count, SUM(total_amount) AS amount
+                      FROM bike_sale_order
+                     WHERE active AND state IN %(sale_states)s
+                  GROUP BY customer_id) s ON s.customer_id = c2.id
+         LEFT JOIN (SELECT customer_id, COUNT(*) AS count, SUM(total_amount) AS amount
+                      FROM bike_rental
+                     WHERE active AND state IN %(rental_states)s
+                  GROUP BY customer_id) r ON r.customer_id = c2.id
+             WHERE c.id = c2.id
+                   {customer_filter}
+        """, {
+            "ids": tuple(self.ids),
+            "sale_states": COUNTED_SALE_STATES,
+            "rental_states": COUNTED_RENTAL_STATES,
+        })
+        self.invalidate_model(["sale_count", "rental_count", "total_sales_amount", "total_rental_amount"])
 
-            customer.sale_count = len(confirmed_sales)
-            customer.rental_count = len(confirmed_rentals)
-            customer.total_sales_amount = sum(confirmed_sales.mapped("total_amount"))
-            customer.total_rental_amount = sum(confirmed_rentals.mapped("total_amount"))
+    def action_rebuild_stats(self):
+        """Bouton / action serveur : reconstruit les statistiques des clients sélectionnés"""
+        self._rebuild_stats()
 
     # ----------------------------
     # Partner helpers (si tu utilises res.partner)
@@ -0,0 +1,215 @@
+import base64
+import hashlib
+import io
+import logging
+
+import psycopg2
+from PIL import Image, ImageOps, features
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# Tailles fournies par image.mixin
+IMAGE_SIZES = (1920, 1024, 512, 256, 128)
+
+# Taille des blocs lus pour calculer l'empreinte d'un fichier
+HASH_BLOCK_SIZE = 1024 * 1024
+# Taille des blocs base64 décodés pour calculer l'empreinte (multiple de 4 caractères)
+BASE64_BLOCK_SIZE = HASH_BLOCK_SIZE // 3 * 4
+
+# Vignettes pré-générées servies par /bike_manager/image/<id>/<variante> (taille maximale en pixels)
+IMAGE_VARIANTS = {
+    "kanban": (320, 320),
+    "list": (128, 128),
+}
+# Formats générés par variante ; le WebP dépend de la compilation de Pillow
+VARIANT_FORMATS = ("webp", "jpeg") if features.check("webp") else ("jpeg",)
+VARIANT_QUALITY = 80
+
+
+def _render_variant(raw, size, image_format):
+    """Vignette d'une image (contenu brut) au format demandé, encodée en base64"""
+    with Image.open(io.BytesIO(raw)) as source:
+        image = ImageOps.exif_transpose(source)
+        image.thumbnail(size)
+        if image_format == "jpeg" and image.mode != "RGB":
+            # Pas de transparence en JPEG : fond blanc
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            if image.mode in ("RGBA", "LA", "P"):
+                image = image.convert("RGBA")
+                background.paste(image, mask=image.split()[-1])
+            else:
+                background.paste(image.convert("RGB"))
+            image = background
+        output = io.BytesIO()
+        image.save(output, image_format.upper(), quality=VARIANT_QUALITY, optimize=True)
+        return base64.b64encode(output.getvalue())
+
+
+def _base64_digest(data):
+    """(empreinte SHA-1, taille) du contenu d'une image base64, décodé bloc par bloc"""
+    if isinstance(data, str):
+        data = data.encode("ascii")
+    if b"\n" in data or b"\r" in data:
+        # Base64 découpé en lignes : les blocs doivent rester alignés sur 4 caractères
+        data = data.translate(None, b"\r\n")
+    digest = hashlib.sha1()
+    size = 0
+    view = memoryview(data)
+    for start in range(0, len(view), BASE64_BLOCK_SIZE):
+        block = base64.b64decode(view[start:start + BASE64_BLOCK_SIZE])
+        digest.update(block)
+        size += len(block)
+    return digest.hexdigest(), size
+
+
+class BikeImage(models.Model):
+    """
+    Images partagées, stockées une seule fois par contenu (empreinte SHA-1).
+    Produits, vélos et catégories y font référence au lieu de garder chacun
+    leur copie de l'image et de ses tailles dérivées.
+    """
+    _name = "bike.image"
+    _description = "Image"
+    _inherit = ["image.mixin"]
+    _rec_name = "checksum"
+
+    checksum = fields.Char(string="Empreinte (SHA-1)", required=True, readonly=True, copy=False)
+    file_size = fields.Integer(string="Taille du fichier (octets)", readonly=True)
+
+    # Vignettes pré-générées (une image partagée ne change jamais de contenu)
+    variant_kanban_webp = fields.Binary(compute="_compute_variants", store=True, attachment=True)
+    variant_kanban_jpeg = fields.Binary(compute="_compute_variants", store=True, attachment=True)
+    variant_list_webp = fields.Binary(compute="_compute_variants", store=True, attachment=True)
+    variant_list_jpeg = fields.Binary(compute="_compute_variants", store=True, attachment=True)
+
+    # Une image par contenu : _find_or_create s'appuie sur cette contrainte (IntegrityError)
+    _checksum_unique = models.Constraint("unique(checksum)", "Cette image existe déjà !")
+
+    @api.depends("image_1920")
+    def _compute_variants(self):
+        for image in self:
+            raw = base64.b64decode(image.image_1920) if image.image_1920 else None
+            for variant, size in IMAGE_VARIANTS.items():
+                for image_format in ("webp", "jpeg"):
+                    value = False
+                    if raw and image_format in VARIANT_FORMATS:
+                        try:
+                            value = _render_variant(raw, size, image_format)
+                        except (OSError, ValueError):
+                            _logger.warning(
+                                "Vignette %s/%s impossible pour l'image %s", variant, image_format, image.id
+                            )
+                    image[f"variant_{variant}_{image_format}"] = value
+
+    def _get_variant(self, variant, accept_webp=True):
+        """(contenu base64, format) de la vignette demandée, WebP si le client l'accepte"""
+        self.ensure_one()
+        for image_format in ("webp", "jpeg") if accept_webp else ("jpeg",):
+            data = self[f"variant_{variant}_{image_format}"]
+            if data:
+                return data, image_format
+        return False, None
+
+    @api.model
+    def _get_or_create(self, data):
+        """
+        Image correspondant à un contenu base64, réutilisée si elle est déjà
+        connue. L'empreinte est calculée en décodant le base64 par blocs : le
+        contenu brut n'est entièrement décodé (par image.mixin) que si l'image
+        est nouvelle.
+        """
+        checksum, size = _base64_digest(data)
+        return self._find_or_create(checksum, size, lambda: data)
+
+    @api.model
+    def _get_or_create_from_file(self, path):
+        """
+        Image correspondant à un fichier. L'empreinte est calculée en flux : le
+        fichier n'est chargé en mémoire que si l'image est nouvelle.
+        """
+        digest = hashlib.sha1()
+        size = 0
+        with open(path, "rb") as image_file:
+            for block in iter(lambda: image_file.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+                size += len(block)
+
+        def load():
+            with open(path, "rb") as image_file:
+                return base64.b64encode(image_file.read())
+
+        return self._find_or_create(digest.hexdigest(), size, load)
+
+    @api.model
+    def _find_or_create(self, checksum, size, load):
+        image = self.search([("checksum", "=", checksum)], limit=1)
+        if image:
+            return image
+        try:
+            with self.env.cr.savepoint():
+                return self.create({"checksum": checksum, "file_size": size, "image_1920": load()})
+        except psycopg2.IntegrityError:
+            # Même image créée en parallèle par une autre transaction
+            return self.search([("checksum", "=", checksum)], limit=1)
+
+    @api.autovacuum
+    def _gc_unused_images(self):
+        """Supprime les images qui ne sont plus référencées"""
+        self.env.cr.execute("""
+            SELECT i.id
+              FROM bike_image i
+             WHERE NOT EXISTS (SELECT 1 FROM bike_product p WHERE p.image_id = i.id)
+               AND NOT EXISTS (SELECT 1 FROM bike_item b WHERE b.image_id = i.id)
+               AND NOT EXISTS (SELECT 1 FROM bike_category c WHERE c.image_id = i.id)
+        """)
+        self.browse([row[0] for row in self.env.cr.fetchall()]).unlink()
+
+
+class BikeImageHolder(models.AbstractModel):
+    """
+    Mixin des modèles affichant une image partagée (bike.image) : les champs
+    image_* se lisent sur l'image référencée, une nouvelle image déposée est
+    rattachée à l'image existante de même contenu.
+    """
+    _name = "bike.image.holder"
+    _description = "Image partagée"
+
+    image_id = fields.Many2one("bike.image", string="Image partagée", ondelete="restrict", index="btree_not_null")
+    image_1920 = fields.Image(string="Image", compute="_compute_images", inverse="_inverse_image_1920")
+    image_1024 = fields.Image(string="Image 1024", compute="_compute_images")
+    image_512 = fields.Image(string="Image 512", compute="_compute_images")
+    image_256 = fields.Image(string="Image 256", compute="_compute_images")
+    image_128 = fields.Image(string="Image 128", compute="_compute_images")
+    # URL des vignettes en cache HTTP : les vues kanban / liste ne chargent plus l'image elle-même
+    image_kanban_url = fields.Char(string="URL vignette kanban", compute="_compute_image_urls")
+    image_list_url = fields.Char(string="URL vignette liste", compute="_compute_image_urls")
+
+    def _get_fallback_image(self):
+        """Image affichée à défaut d'image propre (aucune par défaut)"""
+        return self.env["bike.image"]
+
+    @api.depends("image_id")
+    def _compute_images(self):
+        for record in self:
+            image = record.image_id or record._get_fallback_image()
+            for size in IMAGE_SIZES:
+                record[f"image_{size}"] = image[f"image_{size}"]
+
+    @api.depends("image_id")
+    def _compute_image_urls(self):
+        for record in self:
+            image = record.image_id or record._get_fallback_image()
+            for variant in IMAGE_VARIANTS:
+                record[f"image_{variant}_url"] = f"/bike_manager/image/{image.id}/{variant}" if image else False
+
+    def _inverse_image_1920(self):
+        images = self.env["bike.image"]
+        for record in self:
+            image = images._get_or_create(record.image_1920) if record.image_1920 else images
+            # Inutile de référencer l'image de repli : elle est déjà affichée
+            if image and image == record._get_fallback_image():
+                image = images
+            if record.image_id != image:
+                record.image_id = image
@@ -0,0 +1,113 @@
+"""
+Outils communs aux imports en flux (CSV ou JSON Lines) : les fichiers sont lus
+ligne par ligne, sans être chargés entièrement en mémoire.
+"""
+import base64
+import csv
+import io
+import json
+import os
+
+from odoo import _
+from odoo.exceptions import UserError
+
+# Nombre d'enregistrements créés par appel à create() lors d'un import
+IMPORT_CHUNK_SIZE = 500
+
+IMPORT_FORMATS = [
+    ("csv", "CSV"),
+    ("jsonl", "JSON Lines"),
+    ("json", "JSON"),
+]
+
+
+def guess_format(filename, default="csv"):
+    """Format d'import déduit de l'extension du fichier"""
+    extension = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    return extension if extension in dict(IMPORT_FORMATS) else default
+
+
+def open_binary_field(data):
+    """Flux binaire sur le contenu d'un champ Binary (base64)"""
+    return io.BytesIO(base64.b64decode(data or b""))
+
+
+def to_bool(value):
+    """Booléen d'une cellule (1, true, yes, oui, x)"""
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "oui", "x")
+    return bool(value)
+
+
+def to_float(value, default=0.0):
+    """Nombre d'une cellule (virgule décimale acceptée) ; ValueError si invalide"""
+    if value in (None, ""):
+        return default
+    if isinstance(value, str):
+        value = value.replace(",", ".")
+    try:
+        return float(value)
+    except (TypeError, ValueError) as e:
+        raise ValueError(_("nombre attendu : %s") % value) from e
+
+
+def to_int(value, default=0):
+    """Nombre entier d'une cellule (« 3 » ou « 3.0 ») ; ValueError si invalide"""
+    number = to_float(value, default)
+    if number != int(number):
+        raise ValueError(_("nombre entier attendu : %s") % value)
+    return int(number)
+
+
+def to_selection(value, field, env, default=False):
+    """Clé d'un champ Selection ; ValueError si la valeur n'en fait pas partie"""
+    if value in (None, ""):
+        return default
+    if value not in field.get_values(env):
+        raise ValueError(_("%(field)s inconnu : %(value)s") % {"field": field.string, "value": value})
+    return value
+
+
+def resolve_file_path(directory, filename):
+    """
+    Chemin d'un fichier d'un dossier d'import, ou None s'il est absent ou
+    s'il sort du dossier (« ../ »).
+    """
+    if not directory or not filename:
+        return None
+    root = os.path.realpath(directory)
+    path = os.path.realpath(os.path.join(root, filename))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        return None
+    return path
+
+
+def iter_rows(stream, file_format="csv", delimiter=","):
+    """
+    Produit les lignes d'un fichier sous forme de dictionnaires.
+    CSV et JSON Lines sont lus en flux ; un fichier JSON (tableau d'objets)
+    est chargé en une fois et réservé aux petits volumes.
+    """
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+    if file_format == "csv":
+        for row in csv.DictReader(stream, delimiter=delimiter):
+            yield {
+                (key or "").strip(): value.strip() if isinstance(value, str) else value
+                for key, value in row.items()
+            }
+    elif file_format == "jsonl":
+        for number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise UserError(_("Ligne %(line)s invalide : %(error)s") % {"line": number, "error": e}) from e
+    elif file_format == "json":
+        data = json.load(stream)
+        yield from data if isinstance(data, list) else [data]
+    else:
+        raise UserError(_("Format d'import non pris en charge : %s") % file_format)
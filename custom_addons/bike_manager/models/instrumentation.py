@@ -0,0 +1,173 @@
+import functools
+import logging
+import threading
+import time
+from collections import deque
+
+from odoo import models, fields, api
+
+from .benchmark import _percentile
+
+_logger = logging.getLogger(__name__)
+# Canal dédié aux mesures (niveau DEBUG : chaque appel, WARNING : appels lents)
+_perf_logger = logging.getLogger("odoo.addons.bike_manager.perf")
+
+# Paramètres système : activation ("1") et seuil des appels lents (ms)
+PERF_PARAM = "bike_manager.perf_instrumentation"
+PERF_SLOW_PARAM = "bike_manager.perf_slow_ms"
+PERF_SLOW_DEFAULT = 2000
+# Nombre de mesures conservées par méthode (fenêtre glissante)
+PERF_WINDOW = 1000
+
+# Mesures du processus : (modèle, méthode) -> deque de (durée ms, requêtes SQL, calculs de champs)
+_samples = {}
+_samples_lock = threading.Lock()
+# Par thread : nombre de calculs de champs
+_local = threading.local()
+
+
+def _record(key, sample):
+    with _samples_lock:
+        if key not in _samples:
+            _samples[key] = deque(maxlen=PERF_WINDOW)
+        _samples[key].append(sample)
+
+
+def _compute_count():
+    return getattr(_local, "computes", 0)
+
+
+def _count_computes(method):
+    """Compte les calculs de champs (stockés ou non) des modèles bike.*"""
+    @functools.wraps(method)
+    def wrapper(self, field):
+        _local.computes = _compute_count() + 1
+        return method(self, field)
+    wrapper._bike_perf = True
+    return wrapper
+
+
+def _get_settings(env):
+    """(activée, seuil des appels lents en ms), lus une fois par transaction"""
+    # Données de la transaction, effacées à la validation ou à l'annulation
+    cache = env.cr.precommit.data
+    if PERF_PARAM not in cache:
+        params = env["ir.config_parameter"].sudo()
+        slow_ms = params.get_param(PERF_SLOW_PARAM, PERF_SLOW_DEFAULT)
+        try:
+            slow_ms = int(slow_ms)
+        except (TypeError, ValueError):
+            _logger.warning("Paramètre %s invalide (%r) : %s ms par défaut", PERF_SLOW_PARAM, slow_ms, PERF_SLOW_DEFAULT)
+            slow_ms = PERF_SLOW_DEFAULT
+        cache[PERF_PARAM] = (params.get_param(PERF_PARAM) == "1", slow_ms)
+    return cache[PERF_PARAM]
+
+
+def _instrument(method, key):
+    """Mesure durée, requêtes SQL et calculs de champs d'une méthode, si l'instrumentation est activée"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        enabled, slow_ms = _get_settings(self.env)
+        if not enabled:
+            return method(self, *args, **kwargs)
+        cr = self.env.cr
+        queries = cr.sql_log_count
+        computes = _compute_count()
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            sample = (
+                (time.perf_counter() - started) * 1000.0,
+                cr.sql_log_count - queries,
+                _compute_count() - computes,
+            )
+            _record(key, sample)
+            log = _perf_logger.warning if sample[0] >= slow_ms else _perf_logger.debug
+            log("%s.%s : %.1f ms, %s requêtes, %s calculs (%s enregistrement(s))",
+                *key, *sample, len(self))
+    wrapper._bike_perf = True
+    return wrapper
+
+
+class BikePerfStat(models.TransientModel):
+    """
+    Instrumentation des performances (optionnelle) : mesure chaque appel aux
+    méthodes action_*, create et write des modèles bike.* lorsque le paramètre
+    système bike_manager.perf_instrumentation vaut « 1 ». Les mesures restent
+    en mémoire, par processus (fenêtre glissante), et sont consultables ici.
+    """
+    _name = "bike.perf.stat"
+    _description = "Statistiques de performance"
+    _order = "wall_p95 desc"
+
+    model = fields.Char(string="Modèle", readonly=True)
+    method = fields.Char(string="Méthode", readonly=True)
+    call_count = fields.Integer(string="Appels mesurés", readonly=True)
+    wall_p50 = fields.Float(string="Durée p50 (ms)", readonly=True)
+    wall_p95 = fields.Float(string="Durée p95 (ms)", readonly=True)
+    wall_p99 = fields.Float(string="Durée p99 (ms)", readonly=True)
+    wall_max = fields.Float(string="Durée max (ms)", readonly=True)
+    sql_p50 = fields.Float(string="Requêtes p50", readonly=True)
+    sql_p95 = fields.Float(string="Requêtes p95", readonly=True)
+    compute_p50 = fields.Float(string="Calculs p50", readonly=True)
+    compute_p95 = fields.Float(string="Calculs p95", readonly=True)
+
+    def _register_hook(self):
+        """Enveloppe les méthodes des modèles bike.* (une fois par chargement du registre)"""
+        super()._register_hook()
+        for model_name in list(self.env.registry):
+            model_class = self.env.registry[model_name]
+            if not model_name.startswith("bike.") or model_class._abstract or model_name == self._name:
+                continue
+            if not getattr(model_class._compute_field_value, "_bike_perf", False):
+                model_class._compute_field_value = _count_computes(model_class._compute_field_value)
+            for name in dir(model_class):
+                if name not in ("create", "write") and not name.startswith("action_"):
+                    continue
+                method = getattr(model_class, name)
+                if callable(method) and not getattr(method, "_bike_perf", False):
+                    setattr(model_class, name, _instrument(method, (model_name, name)))
+
+    @api.model
+    def _get_stats(self):
+        """Percentiles des mesures en mémoire : liste de valeurs de bike.perf.stat"""
+        with _samples_lock:
+            samples = {key: list(values) for key, values in _samples.items()}
+        vals_list = []
+        for (model, method), values in sorted(samples.items()):
+            walls, queries, computes = (sorted(column) for column in zip(*values))
+            vals_list.append({
+                "model": model,
+                "method": method,
+                "call_count": len(values),
+                "wall_p50": _percentile(walls, 0.5),
+                "wall_p95": _percentile(walls, 0.95),
+                "wall_p99": _percentile(walls, 0.99),
+                "wall_max": walls[-1],
+                "sql_p50": _percentile(queries, 0.5),
+                "sql_p95": _percentile(queries, 0.95),
+                "compute_p50": _percentile(computes, 0.5),
+                "compute_p95": _percentile(computes, 0.95),
+            })
+        return vals_list
+
+    @api.model
+    def action_refresh(self):
+        """Affiche les statistiques courantes du processus"""
+        self.search([]).unlink()
+        self.create(self._get_stats())
+        return {
+            "type": "ir.actions.act_window",
+            "name": "Statistiques de performance",
+            "res_model": self._name,
+            "view_mode": "list",
+            "target": "current",
+        }
+
+    @api.model
+    def action_reset(self):
+        """Efface les mesures en mémoire du processus"""
+        with _samples_lock:
+            _samples.clear()
+        return self.action_refresh()
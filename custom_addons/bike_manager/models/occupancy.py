@@ -0,0 +1,113 @@
+from datetime import timedelta
+
+from odoo import models, fields, api
+from odoo.tools.sql import create_index, table_exists
+
+# États de location comptés comme occupation du vélo
+OCCUPYING_STATES = ("draft", "ongoing", "returned")
+
+
+class BikeItemOccupancy(models.Model):
+    """
+    Créneaux journaliers occupés par vélo (table précalculée).
+    Tenue à jour à chaque création / modification de location, elle permet de
+    calculer le taux d'occupation d'une flotte par une seule agrégation SQL.
+    """
+    _name = "bike.item.occupancy"
+    _description = "Occupation journalière d'un vélo"
+    _order = "day desc, bike_item_id"
+    _log_access = False
+
+    bike_item_id = fields.Many2one("bike.item", string="Vélo individuel", required=True, ondelete="cascade", index=True)
+    product_id = fields.Many2one("bike.product", string="Modèle de vélo", ondelete="cascade")
+    rental_id = fields.Many2one("bike.rental", string="Location", required=True, ondelete="cascade", index=True)
+    day = fields.Date(string="Jour", required=True)
+    booked_hours = fields.Float(string="Heures réservées")
+
+    def init(self):
+        create_index(self.env.cr, "bike_item_occupancy_day_item_idx", self._table, ["day", "bike_item_id"])
+        # Remplissage initial lors de l'installation sur une base existante
+        if table_exists(self.env.cr, "bike_rental"):
+            self.env.cr.execute("SELECT 1 FROM bike_item_occupancy LIMIT 1")
+            if not self.env.cr.fetchone():
+                self._rebuild_all()
+
+    @api.model
+    def _insert_slots(self, where, params):
+        """Découpe les locations sélectionnées en créneaux journaliers (UTC)."""
+        self.env.cr.execute(f"""
+            INSERT INTO bike_item_occupancy (bike_item_id, product_id, rental_id, day, booked_hours)
+            SELECT r.bike_item_id, r.product_id, r.id, d::date,
+                   EXTRACT(EPOCH FROM LEAST(r.end_date, d + interval '1 day')
+                                    - GREATEST(r.start_date, d)) / 3600.0
+              FROM bike_rental r
+        CROSS JOIN LATERAL generate_series(
+                       date_trunc('day', r.start_date),
+                       r.end_date - interval '1 microsecond',
+                       interval '1 day'
+                   ) AS d
+             WHERE r.active
+               AND r.state IN %s
+               AND r.end_date > r.start_date
+               AND {where}
+        """, [OCCUPYING_STATES, *params])
+        self.invalidate_model()
+
+    @api.model
+    def _sync_rentals(self, rentals):
+        """Recalcule les créneaux des locations données (suppression puis insertion)."""
+        rentals = rentals.filtered("id")
+        if not rentals:
+            return
+        rentals.flush_model(["bike_item_id", "product_id", "start_date", "end_date", "state", "active"])
+        self.env.cr.execute("DELETE FROM bike_item_occupancy WHERE rental_id IN %s", [tuple(rentals.ids)])
+        self._insert_slots("r.id IN %s", [tuple(rentals.ids)])
+
+    @api.model
+    def _rebuild_all(self):
+        """Reconstruit toute la table (rattrapage)."""
+        self.env["bike.rental"].flush_model()
+        self.env.cr.execute("TRUNCATE bike_item_occupancy")
+        self._insert_slots("TRUE", [])
+
+    @api.model
+    def _get_occupancy_rates(self, date_from, date_to, item_ids=None):
+        """
+        Taux d'occupation (%) par vélo sur [date_from, date_to[ en une requête.
+        Retourne {bike_item_id: taux}; les vélos sans réservation n'y figurent pas.
+        """
+        date_from = fields.Date.to_date(date_from)
+        date_to = fields.Date.to_date(date_to)
+        if not date_from or not date_to or date_to <= date_from:
+            return {}
+        capacity = (date_to - date_from).days * 24.0
+
+        params = [date_from, date_to]
+        item_filter = ""
+        if item_ids is not None:
+            if not item_ids:
+                return {}
+            item_filter = "AND bike_item_id IN %s"
+            params.append(tuple(item_ids))
+
+        self.flush_model()
+        self.env.cr.execute(f"""
+            SELECT bike_item_id, SUM(booked_hours)
+              FROM bike_item_occupancy
+             WHERE day >= %s AND day < %s
+                   {item_filter}
+          GROUP BY bike_item_id
+        """, params)
+        return {
+            item_id: min(100.0, hours * 100.0 / capacity)
+            for item_id, hours in self.env.cr.fetchall()
+        }
+
+    @api.model
+    def _get_context_dates(self):
+        """Fenêtre demandée via le contexte (occupancy_date_from / occupancy_date_to), par défaut les 30 derniers jours."""
+        date_to = fields.Date.to_date(self.env.context.get("occupancy_date_to")) or (
+            fields.Date.context_today(self) + timedelta(days=1)
+        )
+        date_from = fields.Date.to_date(self.env.context.get("occupancy_date_from")) or date_to - timedelta(days=30)
+        return date_from, date_to
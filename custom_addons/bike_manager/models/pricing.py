@@ -0,0 +1,82 @@
+"""
+Moteur de tarification des locations : table des types de tarif et calcul de
+la combinaison de tarifs la moins chère (ex: 8 jours = 1 semaine + 1 jour).
+"""
+import math
+
+# Durée d'une unité de location, en heures (mensuel = 30 jours)
+PRICING_UNIT_HOURS = {
+    "hourly": 1.0,
+    "daily": 24.0,
+    "weekly": 24.0 * 7.0,
+    "monthly": 24.0 * 30.0,
+}
+
+# Type de tarif -> (champ de durée sur bike.rental, champ de prix sur bike.product)
+PRICING_FIELDS = {
+    "hourly": ("hours_qty", "rental_price_hourly"),
+    "daily": ("days_qty", "rental_price_daily"),
+    "weekly": ("weeks_qty", "rental_price_weekly"),
+    "monthly": ("months_qty", "rental_price_monthly"),
+}
+
+# Libellés (singulier, pluriel) pour le détail du meilleur tarif
+PRICING_UNIT_LABELS = {
+    "hourly": ("heure", "heures"),
+    "daily": ("jour", "jours"),
+    "weekly": ("semaine", "semaines"),
+    "monthly": ("mois", "mois"),
+}
+
+
+def best_rate_table(rates, max_hours):
+    """
+    Programmation dynamique sur les heures : pour chaque durée h <= max_hours,
+    coût minimal couvrant au moins h heures avec les tarifs disponibles.
+    rates: {type de tarif: prix unitaire} (les prix nuls sont ignorés).
+    Retourne (coûts, choix) où choix[h] est le dernier type de tarif utilisé.
+    """
+    units = [
+        (ptype, int(PRICING_UNIT_HOURS[ptype]), price)
+        for ptype, price in rates.items()
+        if price and price > 0
+    ]
+    costs = [0.0] + [math.inf] * max_hours
+    choices = [None] * (max_hours + 1)
+    for h in range(1, max_hours + 1):
+        for ptype, unit_hours, price in units:
+            cost = costs[max(0, h - unit_hours)] + price
+            if cost < costs[h]:
+                costs[h] = cost
+                choices[h] = ptype
+    return costs, choices
+
+
+def best_rate_breakdown(costs, choices, hours):
+    """Lit la table pour une durée : (prix, {type de tarif: nombre d'unités})."""
+    if hours <= 0 or costs[hours] == math.inf:
+        return 0.0, {}
+    breakdown = {}
+    h = hours
+    while h > 0:
+        ptype = choices[h]
+        breakdown[ptype] = breakdown.get(ptype, 0) + 1
+        h = max(0, h - int(PRICING_UNIT_HOURS[ptype]))
+    return costs[hours], breakdown
+
+
+def format_breakdown(breakdown):
+    """Ex: {'weekly': 1, 'daily': 1} -> '1 semaine + 1 jour' (unités les plus longues d'abord)."""
+    parts = []
+    for ptype in sorted(breakdown, key=lambda p: -PRICING_UNIT_HOURS[p]):
+        count = breakdown[ptype]
+        singular, plural = PRICING_UNIT_LABELS[ptype]
+        parts.append("%s %s" % (count, singular if count == 1 else plural))
+    return " + ".join(parts)
+
+
+def duration_hours(start, end):
+    """Durée entière (arrondie à l'heure supérieure) entre deux datetimes."""
+    if not start or not end or end <= start:
+        return 0
+    return math.ceil((end - start).total_seconds() / 3600.0 - 1e-9)
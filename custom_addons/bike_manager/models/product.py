@@ -1,4 +1,27 @@
+import operator as py_operator
+
 from odoo import models, fields, api, exceptions, _
+from odoo.tools import SQL, split_every
+from odoo.tools.sql import table_exists
+
+from .availability import bump_availability_generation
+from .importing import IMPORT_CHUNK_SIZE, resolve_file_path, to_bool, to_float, to_int, to_selection
+from .pricing import PRICING_FIELDS, best_rate_breakdown, best_rate_table, duration_hours
+
+# Champs produit exposés par la disponibilité publique (nom, location, tarifs)
+AVAILABILITY_FIELDS = {'name', 'active', 'can_be_rented'} | {price for _qty, price in PRICING_FIELDS.values()}
+
+# Opérateurs acceptés par les recherches sur les quantités calculées
+QUANTITY_OPERATORS = {
+    '=': py_operator.eq,
+    '!=': py_operator.ne,
+    '<': py_operator.lt,
+    '<=': py_operator.le,
+    '>': py_operator.gt,
+    '>=': py_operator.ge,
+    'in': lambda quantity, values: quantity in values,
+    'not in': lambda quantity, values: quantity not in values,
+}
 
 
 class BikeProduct(models.Model):
@@ -8,12 +31,11 @@ class BikeProduct(models.Model):
     _name = "bike.product"
     _description = "Produit vélo"
     _order = "name"
-    _inherit = ["image.mixin"]
+    _inherit = ["bike.image.holder"]
 
     name = fields.Char(string="Nom du produit", required=True)
     reference = fields.Char(string="Référence interne", readonly=True, copy=False, default='/')
     description = fields.Text(string="Description")
-    image_1920 = fields.Image(string="Image", max_width=1920, max_height=1920)
 
     # Type de produit
     product_type = fields.Selection([
@@ -42,9 +64,23 @@ class BikeProduct(models.Model):
     rental_price_monthly = fields.Float(string="Prix de location mensuel")
 
     # Stock
-    stock_quantity = fields.Integer(string="Quantité en stock", default=0)
-    reserved_quantity = fields.Integer(string="Quantité réservée", compute='_compute_reserved_quantity', store=True)
-    available_quantity = fields.Integer(string="Quantité disponible", compute='_compute_available_quantity', store=True)
+    # Stock issu du journal des mouvements (niveau courant, ou dernier instantané + mouvements à une date)
+    stock_quantity = fields.Integer(
+        string="Quantité en stock",
+        compute='_compute_stock_quantity',
+        inverse='_inverse_stock_quantity',
+        search='_search_stock_quantity',
+        help="Avec la clé de contexte « stock_date » : stock à cette date",
+    )
+    stock_move_ids = fields.One2many('bike.stock.move', 'product_id', string="Mouvements de stock")
+    # Compteurs tenus à jour par les transitions de location (voir _apply_rental_counter_changes)
+    reserved_quantity = fields.Integer(string="Quantité réservée", default=0, readonly=True, copy=False)
+    rented_quantity = fields.Integer(string="Quantité louée", default=0, readonly=True, copy=False)
+    available_quantity = fields.Integer(
+        string="Quantité disponible",
+        compute='_compute_available_quantity',
+        search='_search_available_quantity',
+    )
 
     # Statut
     state = fields.Selection([
@@ -65,18 +101,26 @@ class BikeProduct(models.Model):
     total_bike_items = fields.Integer(
         string="Nombre total de vélos",
         compute='_compute_bike_item_stats',
+        store=True,
         help="Nombre total de vélos individuels de ce modèle"
     )
     available_bike_items = fields.Integer(
         string="Vélos disponibles",
         compute='_compute_bike_item_stats',
+        store=True,
         help="Nombre de vélos disponibles pour location ou vente"
     )
     rented_bike_items = fields.Integer(
         string="Vélos loués",
         compute='_compute_bike_item_stats',
+        store=True,
         help="Nombre de vélos actuellement loués"
     )
+    free_bike_items = fields.Integer(
+        string="Vélos libres",
+        compute='_compute_free_bike_items',
+        help="Nombre de vélos louables libres sur la période demandée (par défaut les prochaines 24h)"
+    )
 
     _sql_constraints = [
         ('reference_unique', 'unique(reference)', 'La référence produit doit être unique !')
@@ -85,17 +129,200 @@ class BikeProduct(models.Model):
     @api.model_create_multi
     def create(self, vals_list):
         """Génère automatiquement la référence si elle n'est pas fournie"""
-        for vals in vals_list:
-            if not vals.get('reference') or vals.get('reference') == '/':
-                vals['reference'] = self.env['ir.sequence'].next_by_code('bike.product') or '/'
-        return super().create(vals_list)
-
-    @api.depends('rental_ids', 'rental_ids.state')
-    def _compute_reserved_quantity(self):
-        """Calcule la quantité réservée par des locations actives"""
+        self.env['ir.sequence']._assign_block_references(
+            vals_list, 'reference', 'bike.product', placeholders=('/', False, None, '')
+        )
+        products = super().create(vals_list)
+        if any(products.mapped('can_be_rented')):
+            bump_availability_generation(self.env)
+        return products
+
+    def write(self, vals):
+        res = super().write(vals)
+        if AVAILABILITY_FIELDS.intersection(vals):
+            bump_availability_generation(self.env)
+        return res
+
+    def unlink(self):
+        rentable = any(self.mapped('can_be_rented'))
+        res = super().unlink()
+        if rentable:
+            bump_availability_generation(self.env)
+        return res
+
+    def init(self):
+        # Remise à niveau des compteurs de location à chaque mise à jour du module
+        if table_exists(self.env.cr, 'bike_rental'):
+            self._repair_rental_counters()
+
+    @api.model
+    def _apply_rental_counter_changes(self, before, after):
+        """
+        Applique la différence entre deux photos des locations
+        ({id: (produit, réservée 0/1, louée 0/1)}) aux compteurs des produits,
+        en une seule requête UPDATE atomique.
+        """
+        deltas = {}
+        for sign, snapshot in ((-1, before), (1, after)):
+            for product_id, reserved, rented in snapshot.values():
+                if product_id and (reserved or rented):
+                    delta = deltas.setdefault(product_id, [0, 0])
+                    delta[0] += sign * reserved
+                    delta[1] += sign * rented
+        deltas = {product_id: delta for product_id, delta in deltas.items() if any(delta)}
+        if not deltas:
+            return
+        values = ", ".join(["(%s, %s, %s)"] * len(deltas))
+        params = [v for product_id, (reserved, rented) in deltas.items() for v in (product_id, reserved, rented)]
+        self.flush_model(['reserved_quantity', 'rented_quantity'])
+        self.env.cr.execute(f"""
+            UPDATE bike_product p
+               SET reserved_quantity = COALESCE(p.reserved_quantity, 0) + v.reserved,
+                   rented_quantity = COALESCE(p.rented_quantity, 0) + v.rented
+              FROM (VALUES {values}) AS v(id, reserved, rented)
+             WHERE p.id = v.id
+        """, params)
+        self.browse(list(deltas))._counters_modified()
+
+    @api.model
+    def _repair_rental_counters(self):
+        """Recalcule les compteurs depuis les locations actives et corrige les écarts (une requête)."""
+        self.env['bike.rental'].flush_model(['product_id', 'state', 'active'])
+        self.flush_model(['reserved_quantity', 'rented_quantity'])
+        self.env.cr.execute("""
+            UPDATE bike_product p
+               SET reserved_quantity = COALESCE(r.reserved, 0),
+                   rented_quantity = COALESCE(r.rented, 0)
+              FROM bike_product p2
+         LEFT JOIN (SELECT product_id,
+                           COUNT(*) AS reserved,
+                           COUNT(*) FILTER (WHERE state = 'ongoing') AS rented
+                      FROM bike_rental
+                     WHERE active AND state IN ('draft', 'ongoing')
+                  GROUP BY product_id) r ON r.product_id = p2.id
+             WHERE p.id = p2.id
+               AND (p.reserved_quantity IS DISTINCT FROM COALESCE(r.reserved, 0)
+                    OR p.rented_quantity IS DISTINCT FROM COALESCE(r.rented, 0))
+         RETURNING p.id
+        """)
+        self.browse([row[0] for row in self.env.cr.fetchall()])._counters_modified()
+
+    @api.model
+    def _cron_repair_rental_counters(self):
+        """Tâche planifiée : corrige une éventuelle dérive des compteurs de location"""
+        self._repair_rental_counters()
+
+    def _counters_modified(self):
+        """Compteurs modifiés en SQL : vide le cache et recalcule les champs dépendants"""
+        if self:
+            self.invalidate_recordset(['reserved_quantity', 'rented_quantity'])
+            self.modified(['reserved_quantity', 'rented_quantity'])
+
+    @api.model
+    def _get_stock_quantities(self, product_ids=None, date=None):
+        """
+        Stock par produit {id: quantité} en une requête : niveau courant
+        (bike.stock.level) ou, à une date, dernier instantané antérieur +
+        mouvements postérieurs. Sans product_ids, tous les produits sont retournés.
+        """
+        if not date:
+            self.env.cr.execute(f"""
+                SELECT p.id, COALESCE(s.quantity, 0)
+                  FROM bike_product p
+             LEFT JOIN bike_stock_level s ON s.product_id = p.id
+                 {"WHERE p.id = ANY(%s)" if product_ids is not None else ""}
+            """, [list(product_ids)] if product_ids is not None else [])
+            return dict(self.env.cr.fetchall())
+        self.env['bike.stock.move'].flush_model(['product_id', 'date', 'quantity'])
+        self.env['bike.stock.snapshot'].flush_model()
+        snapshot_where = ["TRUE"]
+        move_where = ""
+        product_where = ""
+        params = {'date': date, 'ids': list(product_ids or [])}
+        if date:
+            snapshot_where.append("date <= %(date)s")
+            move_where = "AND m.date <= %(date)s"
+        if product_ids is not None:
+            snapshot_where.append("product_id = ANY(%(ids)s)")
+            product_where = "WHERE p.id = ANY(%(ids)s)"
+        self.env.cr.execute(f"""
+            WITH last AS (
+                SELECT DISTINCT ON (product_id) product_id, date, quantity
+                  FROM bike_stock_snapshot
+                 WHERE {" AND ".join(snapshot_where)}
+              ORDER BY product_id, date DESC
+            )
+            SELECT p.id,
+                   COALESCE(l.quantity, 0) + COALESCE((
+                       SELECT SUM(m.quantity)
+                         FROM bike_stock_move m
+                        WHERE m.product_id = p.id
+                          AND (l.date IS NULL OR m.date > l.date)
+                          {move_where}
+                   ), 0)
+              FROM bike_product p
+         LEFT JOIN last l ON l.product_id = p.id
+             {product_where}
+        """, params)
+        return {product_id: int(quantity) for product_id, quantity in self.env.cr.fetchall()}
+
+    @api.depends('stock_move_ids.quantity')
+    @api.depends_context('stock_date')
+    def _compute_stock_quantity(self):
+        """Calcule le stock depuis le journal des mouvements (un seul appel pour le lot)"""
+        quantities = self._get_stock_quantities(
+            [pid for pid in self.ids if pid], self.env.context.get('stock_date')
+        )
         for product in self:
-            active_rentals = product.rental_ids.filtered(lambda r: r.state in ['draft', 'ongoing'])
-            product.reserved_quantity = len(active_rentals)
+            product.stock_quantity = quantities.get(product.id, 0)
+
+    def _inverse_stock_quantity(self):
+        """Une saisie manuelle du stock est enregistrée comme mouvement d'ajustement"""
+        if any(product.stock_quantity < 0 for product in self):
+            raise exceptions.ValidationError(_("La quantité en stock ne peut pas être négative !"))
+        moves = self.env['bike.stock.move']
+        current = moves._lock_products(self.ids)
+        moves.create([
+            {
+                'product_id': product.id,
+                'quantity': product.stock_quantity - current.get(product.id, 0),
+                'move_type': 'adjustment',
+            }
+            for product in self
+            if product.stock_quantity != current.get(product.id, 0)
+        ])
+
+    def _search_stock_quantity(self, operator, value):
+        if operator not in QUANTITY_OPERATORS:
+            return NotImplemented
+        date = self.env.context.get('stock_date')
+        if date:
+            # Stock à une date (assistant d'inventaire) : reconstitué depuis le journal
+            quantities = self._get_stock_quantities(date=date)
+            match = QUANTITY_OPERATORS[operator]
+            return [('id', 'in', [pid for pid, quantity in quantities.items() if match(quantity, value)])]
+        return self._search_stock_level(SQL("COALESCE(s.quantity, 0)"), operator, value)
+
+    @api.model
+    def _search_stock_level(self, quantity, operator, value):
+        """
+        Domaine des produits dont la quantité (expression SQL sur le produit p
+        et son niveau de stock s) vérifie la condition, évaluée en SQL.
+        """
+        if operator == 'in':
+            condition = SQL("%s = ANY(%s)", quantity, list(value))
+        elif operator == 'not in':
+            condition = SQL("%s <> ALL(%s)", quantity, list(value))
+        else:
+            condition = SQL(f"%s {operator} %s", quantity, value)
+        self.flush_model(['reserved_quantity'])
+        self.env.cr.execute(SQL("""
+            SELECT p.id
+              FROM bike_product p
+         LEFT JOIN bike_stock_level s ON s.product_id = p.id
+             WHERE %s
+        """, condition))
+        return [('id', 'in', [row[0] for row in self.env.cr.fetchall()])]
 
     @api.depends('stock_quantity', 'reserved_quantity')
     def _compute_available_quantity(self):
@@ -103,23 +330,32 @@ class BikeProduct(models.Model):
         for product in self:
             product.available_quantity = product.stock_quantity - product.reserved_quantity
 
-    @api.depends('rental_ids', 'rental_ids.state', 'stock_quantity')
+    def _search_available_quantity(self, operator, value):
+        if operator not in QUANTITY_OPERATORS:
+            return NotImplemented
+        return self._search_stock_level(
+            SQL("COALESCE(s.quantity, 0) - COALESCE(p.reserved_quantity, 0)"), operator, value
+        )
+
+    @api.model
+    def _get_state_from_quantities(self, stock_quantity, rented_quantity):
+        """État d'un produit selon son stock et ses locations en cours"""
+        if stock_quantity == 0:
+            return 'sold'
+        if rented_quantity > 0:
+            return 'rented'
+        return 'available'
+
+    @api.depends('rented_quantity')
     def _compute_state(self):
-        """Calcule l’état selon les locations et le stock"""
+        """
+        Calcule l’état selon les locations et le stock courant. Les mouvements
+        ne le font recalculer que lorsque le stock passe par zéro (voir
+        bike.stock.move.create) : une vente ordinaire ne réécrit pas le produit.
+        """
+        quantities = self._get_stock_quantities([pid for pid in self.ids if pid])
         for product in self:
-            if product.stock_quantity == 0:
-                product.state = 'sold'
-            elif product.rental_ids.filtered(lambda r: r.state == 'ongoing'):
-                product.state = 'rented'
-            else:
-                product.state = 'available'
-
-    @api.constrains('stock_quantity')
-    def _check_stock_quantity(self):
-        """Empêche un stock négatif"""
-        for product in self:
-            if product.stock_quantity < 0:
-                raise exceptions.ValidationError(_("La quantité en stock ne peut pas être négative !"))
+            product.state = self._get_state_from_quantities(quantities.get(product.id, 0), product.rented_quantity)
 
     @api.constrains('sale_price', 'cost_price')
     def _check_prices(self):
@@ -128,29 +364,79 @@ class BikeProduct(models.Model):
             if product.sale_price < 0 or product.cost_price < 0:
                 raise exceptions.ValidationError(_("Les prix doivent être positifs !"))
 
-    @api.constrains('image_1920')
+    @api.constrains('image_id', 'image_1920')
     def _check_image_required(self):
+        # L'import de catalogue vérifie la présence du fichier image avant création
+        # et attache les images après coup (voir _import_product_chunk)
+        if self.env.context.get('bike_skip_image_check'):
+            return
         for product in self:
-            if not product.image_1920:
+            if not product.image_id:
                 raise exceptions.ValidationError(_("Veuillez ajouter une image pour chaque produit."))
 
-    @api.depends('bike_item_ids', 'bike_item_ids.status', 'bike_item_ids.active')
+    @api.depends('product_type', 'bike_item_ids', 'bike_item_ids.status', 'bike_item_ids.active')
     def _compute_bike_item_stats(self):
-        """Calcule les statistiques des vélos individuels"""
+        """Statistiques des vélos individuels de tout le lot en une requête groupée"""
+        bikes = self.filtered(lambda p: p.id and p.product_type == 'bike')
+        counts = {}
+        if bikes:
+            # Les vélos archivés sont exclus (active_test)
+            for product, status, count in self.env['bike.item']._read_group(
+                [('product_id', 'in', bikes.ids)],
+                ['product_id', 'status'],
+                ['__count'],
+            ):
+                counts.setdefault(product.id, {})[status] = count
+        for product in self:
+            by_status = counts.get(product.id, {}) if product.product_type == 'bike' else {}
+            product.total_bike_items = sum(by_status.values())
+            product.available_bike_items = by_status.get('available', 0)
+            product.rented_bike_items = by_status.get('rented', 0)
+
+    def _compute_free_bike_items(self):
+        """Compte les vélos libres de tous les produits en une seule requête"""
+        BikeItem = self.env['bike.item']
+        start, end = BikeItem._get_context_period()
+        products = self.filtered(lambda p: p.product_type == 'bike' and p.can_be_rented and p.id)
+        counts = BikeItem.get_free_item_counts(start, end, product_ids=products.ids) if products else {}
         for product in self:
-            if product.product_type == 'bike':
-                active_items = product.bike_item_ids.filtered(lambda i: i.active)
-                product.total_bike_items = len(active_items)
-                product.available_bike_items = len(active_items.filtered(
-                    lambda i: i.status == 'available'
-                ))
-                product.rented_bike_items = len(active_items.filtered(
-                    lambda i: i.status == 'rented'
-                ))
-            else:
-                product.total_bike_items = 0
-                product.available_bike_items = 0
-                product.rented_bike_items = 0
+            product.free_bike_items = counts.get(product.id, 0)
+
+    def _get_rental_rates(self):
+        """Tarifs de location du produit : {type de tarif: prix unitaire}"""
+        self.ensure_one()
+        return {ptype: self[price_field] for ptype, (qty_field, price_field) in PRICING_FIELDS.items()}
+
+    def _get_rental_quotes(self, start, end):
+        """
+        Meilleur tarif de chaque produit pour la période : {produit: (prix, détail)}.
+        La table des coûts est calculée une fois par produit jusqu'à la durée demandée.
+        """
+        hours = duration_hours(start, end)
+        quotes = {}
+        if hours <= 0:
+            return quotes
+        for product in self:
+            costs, choices = best_rate_table(product._get_rental_rates(), hours)
+            quotes[product] = best_rate_breakdown(costs, choices, hours)
+        return quotes
+
+    def action_reprice_draft_rentals(self):
+        """Applique les tarifs actuels aux locations en brouillon de ces produits"""
+        rentals = self.env['bike.rental'].search([
+            ('product_id', 'in', self.ids),
+            ('state', '=', 'draft'),
+        ])
+        count = rentals._apply_product_rates()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'message': _('%s location(s) en brouillon re-tarifée(s).') % count,
+                'type': 'success',
+                'sticky': False,
+            },
+        }
 
     def action_view_bike_items(self):
         """Action pour voir les vélos individuels de ce produit"""
@@ -163,3 +449,119 @@ class BikeProduct(models.Model):
             'domain': [('product_id', '=', self.id)],
             'context': {'default_product_id': self.id},
         }
+
+    # ----------------------------
+    # Import du catalogue fournisseur
+    # ----------------------------
+    @api.model
+    def _import_product_stream(self, rows, image_dir=None, chunk_size=IMPORT_CHUNK_SIZE):
+        """
+        Importe un catalogue fournisseur depuis un flux de lignes.
+
+        Colonnes : reference, name, product_type, category, bike_model, brand,
+        description, sale_price, cost_price, can_be_rented, rental_price_hourly,
+        rental_price_daily, rental_price_weekly, rental_price_monthly,
+        stock_quantity, image (fichier relatif à image_dir).
+
+        Catégories et modèles sont résolus par un dictionnaire en mémoire (et créés
+        s'ils manquent) ; les produits sont créés par paquets, les compteurs des
+        catégories / modèles sont donc recalculés une fois par paquet.
+        Retourne {'created': n, 'skipped': n, 'errors': [messages]}.
+        """
+        result = {'created': 0, 'skipped': 0, 'errors': []}
+        categories = {
+            category.name: category.id
+            for category in self.env['bike.category'].with_context(active_test=False).search([])
+        }
+        bike_models = {
+            bike_model.name: bike_model.id
+            for bike_model in self.env['bike.model'].with_context(active_test=False).search([])
+        }
+        products = self.with_context(active_test=False, bike_skip_image_check=True)
+        for chunk in split_every(chunk_size, rows, list):
+            products._import_product_chunk(chunk, image_dir, categories, bike_models, result)
+        return result
+
+    @api.model
+    def _import_product_chunk(self, chunk, image_dir, categories, bike_models, result):
+        """Crée un paquet de produits puis leur attache les images une à une"""
+        references = [row.get('reference') for row in chunk if row.get('reference')]
+        existing = set(self.search([('reference', 'in', references)]).mapped('reference'))
+
+        # Catégories et modèles inconnus : créés en une fois pour le paquet
+        new_categories = {row['category'] for row in chunk if row.get('category')} - set(categories)
+        if new_categories:
+            for category in self.env['bike.category'].create([{'name': name} for name in sorted(new_categories)]):
+                categories[category.name] = category.id
+        new_models = {}
+        for row in chunk:
+            if row.get('bike_model') and row['bike_model'] not in bike_models:
+                new_models.setdefault(row['bike_model'], {
+                    'name': row['bike_model'],
+                    'brand': row.get('brand') or False,
+                    'category_id': categories.get(row.get('category')),
+                })
+        if new_models:
+            for bike_model in self.env['bike.model'].create(list(new_models.values())):
+                bike_models[bike_model.name] = bike_model.id
+
+        vals_list = []
+        image_paths = []
+        for row in chunk:
+            reference = row.get('reference') or ''
+            label = reference or row.get('name') or '?'
+            if reference and reference in existing:
+                result['skipped'] += 1
+                continue
+            if not row.get('name') or not row.get('category'):
+                result['errors'].append(_("%s : nom ou catégorie manquant") % label)
+                continue
+            image_path = resolve_file_path(image_dir, row.get('image'))
+            if not image_path:
+                result['errors'].append(_("%(product)s : image introuvable (%(image)s)") % {
+                    'product': label, 'image': row.get('image') or '',
+                })
+                continue
+            try:
+                vals = self._prepare_import_vals(row, categories, bike_models)
+            except ValueError as e:
+                result['errors'].append(_("%(product)s : %(error)s") % {'product': label, 'error': e})
+                continue
+            vals_list.append(vals)
+            image_paths.append(image_path)
+            if reference:
+                existing.add(reference)
+
+        # Images partagées par contenu : l'empreinte est calculée en flux et un
+        # fichier n'est lu entièrement que s'il s'agit d'une nouvelle image
+        images = self.env['bike.image']
+        for product, image_path in zip(self.create(vals_list), image_paths):
+            product.image_id = images._get_or_create_from_file(image_path)
+        result['created'] += len(vals_list)
+        self.env.flush_all()
+        self.env.invalidate_all()
+
+    @api.model
+    def _prepare_import_vals(self, row, categories, bike_models):
+        """Valeurs d'un produit importé ; ValueError si une valeur est invalide"""
+        vals = {
+            'name': row['name'],
+            'product_type': to_selection(row.get('product_type'), self._fields['product_type'], self.env, 'bike'),
+            'category_id': categories[row['category']],
+            'bike_model_id': bike_models.get(row.get('bike_model')) or False,
+            'description': row.get('description') or False,
+            'sale_price': to_float(row.get('sale_price')),
+            'cost_price': to_float(row.get('cost_price')),
+            'can_be_rented': to_bool(row.get('can_be_rented')),
+        }
+        for qty_field, price_field in PRICING_FIELDS.values():
+            vals[price_field] = to_float(row.get(price_field))
+        if vals['sale_price'] < 0 or vals['cost_price'] < 0:
+            raise ValueError(_("prix négatif"))
+        if row.get('reference'):
+            vals['reference'] = row['reference']
+        if row.get('stock_quantity') not in (None, ''):
+            vals['stock_quantity'] = to_int(row['stock_quantity'])
+            if vals['stock_quantity'] < 0:
+                raise ValueError(_("stock négatif : %s") % vals['stock_quantity'])
+        return vals
@@ -0,0 +1,118 @@
+import logging
+from datetime import timedelta
+
+from odoo import models, fields, api, exceptions, _
+from odoo.tools import SQL
+
+from .rental import BLOCKING_STATES
+
+_logger = logging.getLogger(__name__)
+
+# En dessous de cette taille, un parcours séquentiel est le bon choix du planificateur
+SEQ_SCAN_MIN_ROWS = 10000
+
+# Tables lues par les requêtes contrôlées (statistiques rafraîchies avant EXPLAIN)
+HOT_TABLES = ("bike_rental", "bike_item", "bike_customer", "bike_sale_order", "bike_sale_order_line")
+
+
+def _iter_seq_scans(node):
+    """Tables parcourues séquentiellement dans un nœud de plan (EXPLAIN FORMAT JSON) et ses enfants"""
+    if node.get("Node Type") == "Seq Scan":
+        yield node["Relation Name"]
+    for child in node.get("Plans", ()):
+        yield from _iter_seq_scans(child)
+
+
+class BikeQueryPlan(models.AbstractModel):
+    """
+    Contrôle des plans d'exécution des requêtes fréquentes du module (domaines
+    de l'ORM et requêtes SQL de disponibilité), à lancer sur une base peuplée
+    avant une mise en production :
+
+        odoo-bin shell -d <base> <<< "env['bike.query.plan']._check_query_plans()"
+
+    Un parcours séquentiel d'une grande table signale un index manquant ou
+    devenu inutilisable.
+    """
+    _name = "bike.query.plan"
+    _description = "Contrôle des plans de requête"
+
+    @api.model
+    def _get_hot_queries(self):
+        """{nom: requête SQL} des requêtes fréquentes, avec des valeurs prises dans la base"""
+        Rental = self.env["bike.rental"]
+        Item = self.env["bike.item"]
+        Customer = self.env["bike.customer"]
+        Order = self.env["bike.sale.order"]
+        Line = self.env["bike.sale.order.line"]
+
+        rental = Rental.search([], limit=1, order="id desc")
+        item = rental.bike_item_id or Item.search([], limit=1, order="id desc")
+        customer = rental.customer_id or Customer.search([], limit=1, order="id desc")
+        order = Order.search([], limit=1, order="id desc")
+        product = item.product_id
+        start = fields.Datetime.now()
+        end = start + timedelta(days=1)
+
+        # Vélos libres d'un produit : sans filtre, la requête lit toute la flotte louable
+        free_items_sql, free_items_params = Item._get_free_items_query(start, end, product_ids=[product.id or 0])
+        conflicts_sql, conflicts_params = Rental._get_conflicting_rentals_query([rental.id or 0])
+        return {
+            "Chevauchement de locations": SQL(conflicts_sql, *conflicts_params),
+            "Vélos libres d'un produit": SQL(free_items_sql, *free_items_params),
+            "Locations actives d'un vélo": Rental._search([
+                ("bike_item_id", "in", [item.id or 0]),
+                ("state", "in", list(BLOCKING_STATES)),
+            ]).select(),
+            "Locations d'un client": Rental._search([("customer_id", "=", customer.id or 0)]).select(),
+            "Brouillons d'un produit": Rental._search([
+                ("product_id", "in", [product.id or 0]),
+                ("state", "=", "draft"),
+            ]).select(),
+            "Commandes d'un client": Order._search([("customer_id", "=", customer.id or 0)]).select(),
+            "Lignes d'une commande": Line._search([("order_id", "in", [order.id or 0])]).select(),
+            "Ventes d'un produit": Line._search([("product_id", "=", product.id or 0)]).select(),
+            "Vélo par numéro de série": Item._search([("serial_number", "=", item.serial_number or "")]).select(),
+            "Client par e-mail": Customer._search([("email", "in", [customer.email or ""])]).select(),
+        }
+
+    @api.model
+    def _explain(self, query):
+        """Plan estimé (EXPLAIN sans exécution) d'une requête SQL"""
+        self.env.cr.execute(SQL("EXPLAIN (FORMAT JSON) %s", query))
+        return self.env.cr.fetchone()[0][0]["Plan"]
+
+    @api.model
+    def _get_seq_scan_regressions(self, min_rows=SEQ_SCAN_MIN_ROWS):
+        """
+        {nom de requête: tables} des requêtes fréquentes qui parcourent
+        séquentiellement une table d'au moins min_rows lignes.
+        """
+        self.env.flush_all()
+        cr = self.env.cr
+        for table in HOT_TABLES:
+            cr.execute(f"ANALYZE {table}")
+        regressions = {}
+        for name, query in self._get_hot_queries().items():
+            tables = set(_iter_seq_scans(self._explain(query)))
+            if not tables:
+                continue
+            cr.execute(
+                "SELECT relname FROM pg_class WHERE relname IN %s AND reltuples >= %s",
+                [tuple(tables), min_rows],
+            )
+            large_tables = sorted(row[0] for row in cr.fetchall())
+            if large_tables:
+                regressions[name] = large_tables
+        return regressions
+
+    @api.model
+    def _check_query_plans(self, min_rows=SEQ_SCAN_MIN_ROWS):
+        """Échoue si une requête fréquente parcourt séquentiellement une grande table"""
+        regressions = self._get_seq_scan_regressions(min_rows=min_rows)
+        if regressions:
+            raise exceptions.UserError(_("Parcours séquentiels détectés :\n%s") % "\n".join(
+                f"- {name} : {', '.join(tables)}" for name, tables in regressions.items()
+            ))
+        _logger.info("Plans de requête : aucun parcours séquentiel d'une table de plus de %s lignes", min_rows)
+        return True
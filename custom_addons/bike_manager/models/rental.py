@@ -1,7 +1,47 @@
+import logging
+
+import psycopg2
+
 from odoo import models, fields, api, exceptions, _
 from odoo.exceptions import ValidationError
+from odoo.tools.sql import create_index
 from datetime import timedelta
 
+from .availability import bump_availability_generation, create_availability_sequence
+from .customer import COUNTED_RENTAL_STATES
+from .pricing import (
+    PRICING_FIELDS, PRICING_UNIT_HOURS, best_rate_breakdown, best_rate_table, duration_hours, format_breakdown,
+)
+
+_logger = logging.getLogger(__name__)
+
+# États qui bloquent un vélo sur sa période
+BLOCKING_STATES = ("draft", "ongoing")
+
+# Majoration appliquée au tarif pour le temps de retard (150%)
+LATE_FEE_RATE = 1.5
+
+# Champs de location dont dépendent le statut des vélos (bike.item.status)
+# et les compteurs réservé / loué des produits
+ITEM_STATUS_FIELDS = {"bike_item_id", "state", "active"}
+
+# Champs de location dont dépendent les statistiques client (nombre / montant)
+CUSTOMER_STAT_FIELDS = {
+    "customer_id", "state", "active", "unit_price", "pricing_type",
+    "hours_qty", "days_qty", "weeks_qty", "months_qty",
+    "deposit_amount", "additional_charges", "extra_product_ids", "manual_extra_amount",
+}
+
+# Champs dont dépend la table d'occupation (bike.item.occupancy)
+OCCUPANCY_FIELDS = {"bike_item_id", "start_date", "end_date", "state", "active"}
+
+
+def _period_sql(alias=""):
+    """Expression SQL de la période [début, fin) d'une location (doit rester
+    identique à celle de l'index GiST pour que PostgreSQL puisse l'utiliser)."""
+    prefix = f"{alias}." if alias else ""
+    return f"tsrange({prefix}start_date, {prefix}end_date, '[)')"
+
 
 def _sel_range(start, end):
     """Helper: create selection (string) from start..end."""
@@ -14,6 +54,7 @@ class BikeRental(models.Model):
     """
     _name = "bike.rental"
     _description = "Location de vélo"
+    _inherit = ["bike.accounting.mixin"]
     _order = "start_date desc, name desc"
 
     # Référence
@@ -30,7 +71,8 @@ class BikeRental(models.Model):
         "bike.customer",
         string="Client",
         required=True,
-        ondelete="restrict"
+        ondelete="restrict",
+        index=True
     )
 
     # Nouveau: référence vers le vélo individuel
@@ -39,9 +81,15 @@ class BikeRental(models.Model):
         string="Vélo individuel",
         required=True,
         ondelete="restrict",
-        domain="[('usage_type', 'in', ['rental', 'both']), ('status', 'in', ['available', 'reserved'])]",
+        domain="[('id', 'in', available_bike_item_ids)]",
         help="Le vélo spécifique qui sera loué (avec numéro de série)"
     )
+    available_bike_item_ids = fields.Many2many(
+        "bike.item",
+        string="Vélos libres sur la période",
+        compute="_compute_available_bike_item_ids",
+        help="Vélos louables sans location en conflit sur la période choisie"
+    )
 
     # Référence vers le modèle de produit (via bike_item)
     product_id = fields.Many2one(
@@ -53,6 +101,14 @@ class BikeRental(models.Model):
         help="Le modèle de vélo (template)"
     )
 
+    group_id = fields.Many2one(
+        "bike.rental.group",
+        string="Réservation de groupe",
+        ondelete="set null",
+        index=True,
+        copy=False
+    )
+
     # Période
     start_date = fields.Datetime(
         string="Date de début",
@@ -94,6 +150,10 @@ class BikeRental(models.Model):
     duration = fields.Float(string="Durée", compute="_compute_duration", store=True)
     total_price = fields.Float(string="Prix total", compute="_compute_total_price", store=True)
 
+    # Combinaison de tarifs la moins chère pour la période (ex: 1 semaine + 1 jour)
+    best_rate_price = fields.Float(string="Meilleur tarif", compute="_compute_best_rate")
+    best_rate_detail = fields.Char(string="Détail du meilleur tarif", compute="_compute_best_rate")
+
     # Frais
     deposit_amount = fields.Float(string="Montant de la caution", default=0.0)
     additional_charges = fields.Float(
@@ -101,6 +161,19 @@ class BikeRental(models.Model):
         default=0.0,
         help="Retard, dommages, etc."
     )
+    is_overdue = fields.Boolean(
+        string="En retard",
+        default=False,
+        readonly=True,
+        copy=False,
+        help="Location en cours dont la date de fin est dépassée (marquée par la tâche planifiée, effacée au retour ou à l'annulation)."
+    )
+    late_fee_date = fields.Datetime(
+        string="Frais de retard calculés jusqu'au",
+        readonly=True,
+        copy=False,
+        help="Date jusqu'à laquelle les frais de retard ont déjà été ajoutés aux frais supplémentaires."
+    )
 
     # --- Extras (sans nouveau modèle) ---
     extra_product_ids = fields.Many2many(
@@ -163,22 +236,66 @@ class BikeRental(models.Model):
         ("check_dates", "CHECK(end_date > start_date)", "La date de fin doit être après la date de début !")
     ]
 
+    def init(self):
+        """
+        Index GiST (vélo, période) limité aux locations actives : les tests de
+        chevauchement sont résolus par l'index au lieu d'un parcours de table.
+        """
+        cr = self.env.cr
+        expressions = ["bike_item_id", _period_sql()]
+        try:
+            # btree_gist est nécessaire pour indexer l'entier bike_item_id en GiST
+            with cr.savepoint(flush=False):
+                cr.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        except psycopg2.Error:
+            _logger.warning("Extension btree_gist indisponible : index de disponibilité sur la période seule.")
+            expressions = [_period_sql()]
+        create_index(
+            cr,
+            "bike_rental_item_period_gist_idx",
+            self._table,
+            expressions,
+            method="gist",
+            where="state IN ('draft', 'ongoing') AND active",
+        )
+        # Locations en cours par date de fin (recherche des retards)
+        create_index(
+            cr,
+            "bike_rental_ongoing_end_date_idx",
+            self._table,
+            ["end_date"],
+            where="state = 'ongoing'",
+        )
+        # Locations d'un vélo par état (statut, location en cours, statistiques)
+        create_index(
+            cr,
+            "bike_rental_item_state_date_idx",
+            self._table,
+            ["bike_item_id", "state", "start_date"],
+        )
+        # Locations d'un produit par état (compteurs, mise à jour des tarifs)
+        create_index(
+            cr,
+            "bike_rental_product_state_idx",
+            self._table,
+            ["product_id", "state"],
+        )
+        # Génération du cache de disponibilité publique
+        create_availability_sequence(cr)
+
     # -----------------------------
     # COMPUTE: rental_qty
     # -----------------------------
+    def _get_rental_qty(self):
+        """Quantité saisie dans le champ de durée du type de tarif (0 si aucun)."""
+        self.ensure_one()
+        qty_field = PRICING_FIELDS.get(self.pricing_type, (None, None))[0]
+        return float(self[qty_field] or "0") if qty_field else 0.0
+
     @api.depends("pricing_type", "hours_qty", "days_qty", "weeks_qty", "months_qty")
     def _compute_rental_qty(self):
         for r in self:
-            if r.pricing_type == "hourly":
-                r.rental_qty = float(r.hours_qty or "0")
-            elif r.pricing_type == "daily":
-                r.rental_qty = float(r.days_qty or "0")
-            elif r.pricing_type == "weekly":
-                r.rental_qty = float(r.weeks_qty or "0")
-            elif r.pricing_type == "monthly":
-                r.rental_qty = float(r.months_qty or "0")
-            else:
-                r.rental_qty = 0.0
+            r.rental_qty = r._get_rental_qty()
 
     # -----------------------------
     # CREATE + SEQUENCE + END_DATE
@@ -189,48 +306,89 @@ class BikeRental(models.Model):
         - Génère la référence via sequence
         - Calcule end_date si manquante
         """
+        # Références réservées en un bloc pour tout le lot
+        self.env["ir.sequence"]._assign_block_references(vals_list, "name", "bike.rental")
         for vals in vals_list:
-            if vals.get("name", "New") == "New":
-                vals["name"] = self.env["ir.sequence"].next_by_code("bike.rental") or "New"
-
             start = vals.get("start_date")
             ptype = vals.get("pricing_type")
             end = vals.get("end_date")
 
             # qty par défaut = 1 (utile si création hors UI)
             qty = 0.0
-            if ptype == "hourly":
-                qty = float(vals.get("hours_qty") or 1)
-            elif ptype == "daily":
-                qty = float(vals.get("days_qty") or 1)
-            elif ptype == "weekly":
-                qty = float(vals.get("weeks_qty") or 1)
-            elif ptype == "monthly":
-                qty = float(vals.get("months_qty") or 1)
+            if ptype in PRICING_FIELDS:
+                qty = float(vals.get(PRICING_FIELDS[ptype][0]) or 1)
 
             if start and ptype and qty and not end:
                 start_dt = fields.Datetime.to_datetime(start)
                 vals["end_date"] = self._calc_end_date(start_dt, ptype, qty)
 
-        return super().create(vals_list)
+        rentals = super().create(vals_list)
+        self.env["bike.item.occupancy"]._sync_rentals(rentals)
+        rentals.bike_item_id._sync_rental_status()
+        self.env["bike.product"]._apply_rental_counter_changes({}, rentals._get_product_counter_values())
+        self.env["bike.customer"]._apply_stat_changes("rental", {}, rentals._get_customer_stat_values())
+        bump_availability_generation(self.env)
+        return rentals
+
+    def write(self, vals):
+        # Vélos concernés avant modification (en cas de changement de vélo)
+        old_items = self.bike_item_id if ITEM_STATUS_FIELDS.intersection(vals) else None
+        counters_before = self._get_product_counter_values() if old_items is not None else None
+        stats_before = self._get_customer_stat_values() if CUSTOMER_STAT_FIELDS.intersection(vals) else None
+        res = super().write(vals)
+        # Statistiques client : seule la différence est appliquée
+        if stats_before is not None:
+            self.env["bike.customer"]._apply_stat_changes("rental", stats_before, self._get_customer_stat_values())
+        # Créneaux d'occupation : uniquement si la période, le vélo ou l'état changent
+        if OCCUPANCY_FIELDS.intersection(vals):
+            self.env["bike.item.occupancy"]._sync_rentals(self)
+            bump_availability_generation(self.env)
+        # Statut des vélos et compteurs produit : recalculés depuis les seules locations actives
+        if old_items is not None:
+            (old_items | self.bike_item_id)._sync_rental_status()
+            self.env["bike.product"]._apply_rental_counter_changes(
+                counters_before, self._get_product_counter_values()
+            )
+        return res
+
+    def unlink(self):
+        items = self.bike_item_id
+        stats_before = self._get_customer_stat_values()
+        counters_before = self._get_product_counter_values()
+        res = super().unlink()
+        items._sync_rental_status()
+        self.env["bike.product"]._apply_rental_counter_changes(counters_before, {})
+        self.env["bike.customer"]._apply_stat_changes("rental", stats_before, {})
+        bump_availability_generation(self.env)
+        return res
+
+    def _get_product_counter_values(self):
+        """Contribution de chaque location aux compteurs produit : {id: (produit, réservée, louée)}"""
+        return {
+            r.id: (
+                r.product_id.id,
+                int(r.active and r.state in BLOCKING_STATES),
+                int(r.active and r.state == "ongoing"),
+            )
+            for r in self
+        }
+
+    def _get_customer_stat_values(self):
+        """Contribution de chaque location aux statistiques client : {id: (client, nombre, montant)}"""
+        return {
+            r.id: (r.customer_id.id, 1, r.total_amount or 0.0)
+            if r.active and r.state in COUNTED_RENTAL_STATES else (r.customer_id.id, 0, 0.0)
+            for r in self
+        }
 
     # -----------------------------
     # Helpers dates
     # -----------------------------
     def _calc_end_date(self, start_dt, pricing_type, qty):
-        if qty <= 0:
+        if qty <= 0 or pricing_type not in PRICING_UNIT_HOURS:
             return False
-
-        if pricing_type == "hourly":
-            return start_dt + timedelta(hours=qty)
-        if pricing_type == "daily":
-            return start_dt + timedelta(days=qty)
-        if pricing_type == "weekly":
-            return start_dt + timedelta(weeks=qty)
-        if pricing_type == "monthly":
-            # simple 30j
-            return start_dt + timedelta(days=30 * qty)
-        return False
+        # mensuel = 30 jours
+        return start_dt + timedelta(hours=qty * PRICING_UNIT_HOURS[pricing_type])
 
     # -----------------------------
     # ONCHANGE: prix + date de fin
@@ -238,16 +396,8 @@ class BikeRental(models.Model):
     @api.onchange("bike_item_id", "pricing_type")
     def _onchange_product_pricing(self):
         """Met à jour le prix unitaire selon le vélo et le type."""
-        if self.bike_item_id and self.bike_item_id.product_id and self.pricing_type:
-            product = self.bike_item_id.product_id
-            if self.pricing_type == "hourly":
-                self.unit_price = product.rental_price_hourly
-            elif self.pricing_type == "daily":
-                self.unit_price = product.rental_price_daily
-            elif self.pricing_type == "weekly":
-                self.unit_price = product.rental_price_weekly
-            elif self.pricing_type == "monthly":
-                self.unit_price = product.rental_price_monthly
+        if self.bike_item_id and self.bike_item_id.product_id and self.pricing_type in PRICING_FIELDS:
+            self.unit_price = self.bike_item_id.product_id[PRICING_FIELDS[self.pricing_type][1]]
 
     @api.onchange("start_date", "pricing_type", "hours_qty", "days_qty", "weeks_qty", "months_qty")
     def _onchange_compute_end_date(self):
@@ -256,16 +406,7 @@ class BikeRental(models.Model):
             return
 
         # IMPORTANT: ne pas dépendre de rental_qty en onchange
-        if self.pricing_type == "hourly":
-            qty = float(self.hours_qty or "0")
-        elif self.pricing_type == "daily":
-            qty = float(self.days_qty or "0")
-        elif self.pricing_type == "weekly":
-            qty = float(self.weeks_qty or "0")
-        elif self.pricing_type == "monthly":
-            qty = float(self.months_qty or "0")
-        else:
-            qty = 0.0
+        qty = self._get_rental_qty()
 
         if qty <= 0:
             self.end_date = False
@@ -285,14 +426,8 @@ class BikeRental(models.Model):
                     continue
                 delta = r.end_date - r.start_date
                 total_hours = delta.total_seconds() / 3600.0
-                if r.pricing_type == "hourly":
-                    r.duration = total_hours
-                elif r.pricing_type == "daily":
-                    r.duration = total_hours / 24.0
-                elif r.pricing_type == "weekly":
-                    r.duration = total_hours / (24.0 * 7.0)
-                elif r.pricing_type == "monthly":
-                    r.duration = total_hours / (24.0 * 30.0)
+                if r.pricing_type in PRICING_UNIT_HOURS:
+                    r.duration = total_hours / PRICING_UNIT_HOURS[r.pricing_type]
                 else:
                     r.duration = 0.0
             else:
@@ -301,19 +436,53 @@ class BikeRental(models.Model):
     @api.depends("pricing_type", "hours_qty", "days_qty", "weeks_qty", "months_qty", "unit_price")
     def _compute_total_price(self):
         for r in self:
-            if r.pricing_type == "hourly":
-                qty = float(r.hours_qty or "0")
-            elif r.pricing_type == "daily":
-                qty = float(r.days_qty or "0")
-            elif r.pricing_type == "weekly":
-                qty = float(r.weeks_qty or "0")
-            elif r.pricing_type == "monthly":
-                qty = float(r.months_qty or "0")
-            else:
-                qty = 0.0
+            r.total_price = max(0.0, r._get_rental_qty() * (r.unit_price or 0.0))
 
-            r.total_price = max(0.0, (qty or 0.0) * (r.unit_price or 0.0))
 
+    @api.depends(
+        "start_date", "end_date", "product_id",
+        "product_id.rental_price_hourly", "product_id.rental_price_daily",
+        "product_id.rental_price_weekly", "product_id.rental_price_monthly",
+    )
+    def _compute_best_rate(self):
+        prices = self._price_best_rates()
+        for r in self:
+            price, breakdown = prices.get(r, (0.0, {}))
+            r.best_rate_price = price
+            r.best_rate_detail = format_breakdown(breakdown)
+
+    def _price_best_rates(self):
+        """
+        Meilleur tarif de tout le lot en une passe : une table de coûts par
+        produit (jusqu'à la plus longue location du lot) sert toutes ses locations.
+        Retourne {location: (prix, {type de tarif: nombre d'unités})}.
+        """
+        result = {}
+        hours_by_rental = {r: duration_hours(r.start_date, r.end_date) for r in self}
+        for product in self.product_id:
+            rentals = self.filtered(lambda r, p=product: r.product_id == p and hours_by_rental[r] > 0)
+            if not rentals:
+                continue
+            costs, choices = best_rate_table(
+                product._get_rental_rates(), max(hours_by_rental[r] for r in rentals)
+            )
+            for r in rentals:
+                result[r] = best_rate_breakdown(costs, choices, hours_by_rental[r])
+        return result
+
+    def _apply_product_rates(self):
+        """
+        Re-tarifie en lot les locations en brouillon avec le tarif actuel de leur
+        produit : une écriture par prix distinct, recalcul groupé des totaux.
+        """
+        by_price = {}
+        for r in self.filtered(lambda r: r.state == "draft" and r.product_id and r.pricing_type in PRICING_FIELDS):
+            price = r.product_id[PRICING_FIELDS[r.pricing_type][1]]
+            if price != r.unit_price:
+                by_price.setdefault(price, []).append(r.id)
+        for price, rental_ids in by_price.items():
+            self.browse(rental_ids).write({"unit_price": price})
+        return sum(len(ids) for ids in by_price.values())
 
     @api.depends("extra_product_ids")
     def _compute_extras_total(self):
@@ -346,29 +515,66 @@ class BikeRental(models.Model):
     # -----------------------------
     # DISPONIBILITÉ
     # -----------------------------
+    def _get_conflicting_rentals(self):
+        """
+        Retourne {location: location en conflit} pour tout le lot en une seule
+        requête. Deux périodes [a, b) et [c, d) se chevauchent si a < d et c < b,
+        ce qui couvre aussi une location entièrement incluse dans une autre.
+        """
+        rentals = self.filtered(
+            lambda r: r.state in BLOCKING_STATES and r.bike_item_id and r.start_date and r.end_date
+        )
+        if not rentals:
+            return {}
+        self.flush_model(["bike_item_id", "start_date", "end_date", "state", "active"])
+        self.env.cr.execute(*self._get_conflicting_rentals_query(rentals.ids))
+        return {
+            self.browse(rental_id): self.browse(other_id)
+            for rental_id, other_id in self.env.cr.fetchall()
+        }
+
+    @api.model
+    def _get_conflicting_rentals_query(self, rental_ids):
+        """Requête SQL et paramètres de _get_conflicting_rentals"""
+        return f"""
+            SELECT DISTINCT ON (r.id) r.id, o.id
+              FROM bike_rental r
+              JOIN bike_rental o
+                ON o.bike_item_id = r.bike_item_id
+               AND o.id != r.id
+               AND o.state IN %s
+               AND o.active
+               AND {_period_sql("o")} && {_period_sql("r")}
+             WHERE r.id IN %s
+          ORDER BY r.id, o.start_date
+        """, [BLOCKING_STATES, tuple(rental_ids)]
+
+    @api.depends("start_date", "end_date")
+    def _compute_available_bike_item_ids(self):
+        BikeItem = self.env["bike.item"]
+        for r in self:
+            if r.start_date and r.end_date:
+                r.available_bike_item_ids = BikeItem._get_free_items(
+                    r.start_date, r.end_date, exclude_rental_ids=r._origin.ids
+                )
+            else:
+                r.available_bike_item_ids = BikeItem.search([
+                    ("usage_type", "in", ["rental", "both"]),
+                    ("status", "in", ["available", "reserved"]),
+                ])
+
     @api.constrains("bike_item_id", "start_date", "end_date", "state")
     def _check_availability(self):
         """Vérifie qu'un vélo individuel n'est pas déjà loué sur la période"""
-        for r in self:
-            if r.state in ["draft", "ongoing"] and r.bike_item_id and r.start_date and r.end_date:
-                # Vérifie qu'il n'y a pas de chevauchement avec une autre location
-                overlapping = self.search([
-                    ("id", "!=", r.id),
-                    ("bike_item_id", "=", r.bike_item_id.id),
-                    ("state", "in", ["draft", "ongoing"]),
-                    "|",
-                    "&", ("start_date", "<=", r.start_date), ("end_date", ">", r.start_date),
-                    "&", ("start_date", "<", r.end_date), ("end_date", ">=", r.end_date),
-                ], limit=1)
-                if overlapping:
-                    raise exceptions.ValidationError(_(
-                        "Le vélo %(bike)s (%(serial)s) est déjà loué sur cette période !\n"
-                        "Location en conflit: %(rental)s"
-                    ) % {
-                        "bike": r.bike_item_id.product_id.name if r.bike_item_id.product_id else "inconnu",
-                        "serial": r.bike_item_id.serial_number,
-                        "rental": overlapping.name
-                    })
+        for r, overlapping in self._get_conflicting_rentals().items():
+            raise exceptions.ValidationError(_(
+                "Le vélo %(bike)s (%(serial)s) est déjà loué sur cette période !\n"
+                "Location en conflit: %(rental)s"
+            ) % {
+                "bike": r.bike_item_id.product_id.name if r.bike_item_id.product_id else "inconnu",
+                "serial": r.bike_item_id.serial_number,
+                "rental": overlapping.name
+            })
 
     # -----------------------------
     # ACTIONS
@@ -388,9 +594,71 @@ class BikeRental(models.Model):
                     "serial": r.bike_item_id.serial_number
                 })
 
-            # Met à jour le statut du vélo
-            r.bike_item_id.status = 'rented'
-            r.state = "ongoing"
+        # Le statut des vélos suit le changement d'état (voir write)
+        self.write({"state": "ongoing"})
+
+    @api.model
+    def _accrue_late_fees(self, now, rental_ids=None):
+        """
+        Marque en retard les locations en cours dont la fin est dépassée et
+        ajoute les frais de retard depuis le dernier calcul, pour tous les types
+        de tarif, en une seule requête UPDATE :
+            heures de retard / heures par unité * prix unitaire * 150%
+        Retourne les locations mises à jour.
+        """
+        unit_hours = " ".join(
+            f"WHEN '{ptype}' THEN {hours}" for ptype, hours in PRICING_UNIT_HOURS.items()
+        )
+        params = {"now": now, "rate": LATE_FEE_RATE, "uid": self.env.uid}
+        rental_filter = ""
+        if rental_ids is not None:
+            if not rental_ids:
+                return self.browse()
+            rental_filter = "AND id IN %(ids)s"
+            params["ids"] = tuple(rental_ids)
+
+        self.flush_model(["state", "end_date", "active", "pricing_type", "unit_price",
+                          "additional_charges", "late_fee_date"])
+        self.env.cr.execute(f"""
+            WITH fees AS (
+                SELECT id,
+                       (EXTRACT(EPOCH FROM %(now)s - GREATEST(end_date, COALESCE(late_fee_date, end_date))) / 3600.0
+                        / (CASE pricing_type {unit_hours} ELSE 24.0 END)
+                        * COALESCE(unit_price, 0.0) * %(rate)s)::float8 AS fee
+                  FROM bike_rental
+                 WHERE state = 'ongoing'
+                   AND active
+                   AND end_date < %(now)s
+                   {rental_filter}
+            )
+            UPDATE bike_rental r
+               SET is_overdue = TRUE,
+                   additional_charges = COALESCE(r.additional_charges, 0.0) + fees.fee,
+                   late_fee_date = %(now)s,
+                   write_date = (now() at time zone 'UTC'),
+                   write_uid = %(uid)s
+              FROM fees
+             WHERE r.id = fees.id
+         RETURNING r.id, r.customer_id, fees.fee
+        """, params)
+        rows = self.env.cr.fetchall()
+        rentals = self.browse([row[0] for row in rows])
+        # Statistiques client : les locations en cours sont comptées, seul le montant change
+        self.env["bike.customer"]._apply_stat_changes(
+            "rental", {}, {rental_id: (customer_id, 0, fee) for rental_id, customer_id, fee in rows}
+        )
+        if rentals:
+            # Les champs modifiés en SQL : on vide le cache et on déclenche
+            # le recalcul des champs dépendants (total_amount, ...)
+            fnames = ["is_overdue", "additional_charges", "late_fee_date"]
+            rentals.invalidate_recordset(fnames + ["write_date", "write_uid"])
+            rentals.modified(fnames)
+        return rentals
+
+    @api.model
+    def _cron_flag_overdue_rentals(self):
+        """Tâche planifiée : repère les locations en retard et cumule leurs frais"""
+        self._accrue_late_fees(fields.Datetime.now())
 
     def action_return_bike(self):
         """Retour du vélo et calcul des frais de retard"""
@@ -398,20 +666,11 @@ class BikeRental(models.Model):
             if r.state != "ongoing":
                 raise exceptions.ValidationError(_("Seules les locations en cours peuvent être retournées !"))
 
-            now = fields.Datetime.now()
-
-            # Calcul des frais de retard
-            if r.end_date and now > r.end_date:
-                late_duration = (now - r.end_date).total_seconds() / 3600.0
-                if r.pricing_type == "daily":
-                    late_days = late_duration / 24.0
-                    r.additional_charges += late_days * (r.unit_price or 0.0) * 1.5
-
-            # Remet le vélo en disponible
-            if r.bike_item_id:
-                r.bike_item_id.status = 'available'
+        # Calcul des frais de retard (tous types de tarif, depuis le dernier passage de la tâche)
+        self._accrue_late_fees(fields.Datetime.now(), rental_ids=self.ids)
 
-            r.state = "returned"
+        # Le vélo redevient disponible via la synchronisation du statut (voir write)
+        self.write({"state": "returned", "is_overdue": False})
 
     def action_cancel(self):
         """Annule la location et libère le vélo"""
@@ -419,11 +678,8 @@ class BikeRental(models.Model):
             if r.state == "returned":
                 raise exceptions.ValidationError(_("Impossible d'annuler une location retournée !"))
 
-            # Libère le vélo si la location était en cours
-            if r.state == "ongoing" and r.bike_item_id:
-                r.bike_item_id.status = 'available'
-
-            r.state = "cancelled"
+        # Le vélo est libéré via la synchronisation du statut (voir write)
+        self.write({"state": "cancelled", "is_overdue": False})
 
     def action_set_draft(self):
         """Remet en brouillon"""
@@ -438,59 +694,11 @@ class BikeRental(models.Model):
     invoice_id = fields.Many2one("account.move", string="Facture", readonly=True, copy=False)
     invoice_state = fields.Selection(related="invoice_id.state", string="Statut facture", readonly=True)
 
-    def _get_sale_journal(self):
-        journal = self.env["account.journal"].search([
-            ("type", "=", "sale"),
-            ("company_id", "=", self.env.company.id)
-        ], limit=1)
-        if not journal:
-            raise ValidationError(_("Aucun journal de vente trouvé (type = sale)."))
-        return journal
-
-    def _get_income_account(self):
-        Account = self.env["account.account"]
-        domain = []
-
-        if "account_type" in Account._fields:
-            domain.append(("account_type", "=", "income"))
-        elif "internal_group" in Account._fields:
-            domain.append(("internal_group", "=", "income"))
-
-        if "active" in Account._fields:
-            domain.append(("active", "=", True))
-        if "deprecated" in Account._fields:
-            domain.append(("deprecated", "=", False))
-
-        if "company_id" in Account._fields:
-            domain.append(("company_id", "=", self.env.company.id))
-        elif "company_ids" in Account._fields:
-            domain.append(("company_ids", "in", self.env.company.id))
-
-        acc = Account.search(domain, limit=1)
-        if not acc:
-            raise ValidationError(_("Aucun compte de revenu (income) trouvé."))
-        return acc
-
-    def _get_sale_tax_21(self):
-        Tax = self.env["account.tax"]
-        domain = [("type_tax_use", "=", "sale"), ("amount", "=", 21)]
-
-        if "company_id" in Tax._fields:
-            domain.append(("company_id", "=", self.env.company.id))
-        elif "company_ids" in Tax._fields:
-            domain.append(("company_ids", "in", self.env.company.id))
-
-        return Tax.search(domain, limit=1)
-
-    def action_create_invoice(self):
+    def _prepare_invoice_line_vals(self, income_account, tax, with_reference=False):
+        """Lignes de facture d'une location (config comptable déjà résolue)."""
         self.ensure_one()
-        if self.invoice_id:
-            return self.action_view_invoice()
-
-        partner = self.customer_id._get_or_create_partner()
-        journal = self._get_sale_journal()
-        income_account = self._get_income_account()
-        tax = self._get_sale_tax_21()
+        tax_ids = [(6, 0, tax.ids)] if tax else False
+        prefix = "%s - " % self.name if with_reference else ""
 
         # Nom détaillé avec le numéro de série
         bike_description = self.bike_item_id.name if self.bike_item_id else (
@@ -498,11 +706,11 @@ class BikeRental(models.Model):
         )
 
         line_vals = [{
-            "name": _("Location vélo: %s") % bike_description,
+            "name": prefix + _("Location vélo: %s") % bike_description,
             "quantity": 1.0,
             "price_unit": self.total_price,
             "account_id": income_account.id,
-            "tax_ids": [(6, 0, tax.ids)] if tax else False,
+            "tax_ids": tax_ids,
         }]
 
         # Accessoires (1 unité par produit)
@@ -515,56 +723,102 @@ class BikeRental(models.Model):
 
             if price:
                 line_vals.append({
-                    "name": _("Accessoire / pièce: %s") % (p.name),
+                    "name": prefix + _("Accessoire / pièce: %s") % (p.name),
                     "quantity": 1.0,
                     "price_unit": price,
                     "account_id": income_account.id,
-                    "tax_ids": [(6, 0, tax.ids)] if tax else False,
+                    "tax_ids": tax_ids,
                 })
 
         # Frais manuels
         if self.manual_extra_amount:
             line_vals.append({
-                "name": _("Frais supplémentaires (manuel)"),
+                "name": prefix + _("Frais supplémentaires (manuel)"),
                 "quantity": 1.0,
                 "price_unit": self.manual_extra_amount,
                 "account_id": income_account.id,
-                "tax_ids": [(6, 0, tax.ids)] if tax else False,
+                "tax_ids": tax_ids,
             })
 
         # Retard / dommages
         if self.additional_charges:
             line_vals.append({
-                "name": _("Frais supplémentaires (retard/dommages)"),
+                "name": prefix + _("Frais supplémentaires (retard/dommages)"),
                 "quantity": 1.0,
                 "price_unit": self.additional_charges,
                 "account_id": income_account.id,
-                "tax_ids": [(6, 0, tax.ids)] if tax else False,
+                "tax_ids": tax_ids,
+            })
+
+        return line_vals
+
+    def _create_invoices(self, grouped=False):
+        """
+        Facture en lot les locations sans facture (hors annulées) :
+        - journal, compte de revenu et TVA résolus une seule fois
+        - contact Odoo synchronisé une fois par client
+        - toutes les factures créées en un seul appel à create
+        Si grouped=True, une seule facture par client regroupe ses locations.
+        """
+        rentals = self.filtered(lambda r: not r.invoice_id and r.state != "cancelled")
+        if not rentals:
+            return self.env["account.move"]
+
+        journal = rentals._get_sale_journal()
+        income_account = rentals._get_income_account()
+        tax = rentals._get_sale_tax_21()
+        partners = {customer: customer._get_or_create_partner() for customer in rentals.customer_id}
+
+        if grouped:
+            batches = [rentals.filtered(lambda r, c=customer: r.customer_id == c) for customer in rentals.customer_id]
+        else:
+            batches = list(rentals)
+
+        invoice_date = fields.Date.context_today(self)
+        move_vals_list = []
+        for batch in batches:
+            line_vals = []
+            for r in batch:
+                line_vals += r._prepare_invoice_line_vals(income_account, tax, with_reference=len(batch) > 1)
+            origin = ", ".join(batch.mapped("name"))
+            move_vals_list.append({
+                "move_type": "out_invoice",
+                "partner_id": partners[batch.customer_id].id,
+                "invoice_date": invoice_date,
+                "journal_id": journal.id,
+                "invoice_origin": origin,
+                "ref": origin,
+                "invoice_line_ids": [(0, 0, v) for v in line_vals],
             })
 
-        move = self.env["account.move"].create({
-            "move_type": "out_invoice",
-            "partner_id": partner.id,
-            "invoice_date": fields.Date.context_today(self),
-            "journal_id": journal.id,
-            "invoice_origin": self.name,
-            "ref": self.name,
-            "invoice_line_ids": [(0, 0, v) for v in line_vals],
-        })
-
-        self.invoice_id = move.id
+        moves = self.env["account.move"].create(move_vals_list)
+        for batch, move in zip(batches, moves):
+            batch.invoice_id = move.id
+        return moves
+
+    def action_create_invoice(self):
+        """Crée les factures manquantes (contexte bike_invoice_grouped : une facture par client)"""
+        self._create_invoices(grouped=self.env.context.get("bike_invoice_grouped", False))
         return self.action_view_invoice()
 
     def action_view_invoice(self):
-        self.ensure_one()
-        if not self.invoice_id:
+        invoices = self.invoice_id
+        if not invoices:
             raise ValidationError(_("Aucune facture liée à cette location."))
+        if len(invoices) == 1:
+            return {
+                "type": "ir.actions.act_window",
+                "name": _("Facture"),
+                "res_model": "account.move",
+                "view_mode": "form",
+                "res_id": invoices.id,
+            }
         return {
             "type": "ir.actions.act_window",
-            "name": _("Facture"),
+            "name": _("Factures"),
             "res_model": "account.move",
-            "view_mode": "form",
-            "res_id": self.invoice_id.id,
+            "view_mode": "list,form",
+            "domain": [("id", "in", invoices.ids)],
         }
 
     def action_print_invoice(self):
@@ -0,0 +1,240 @@
+from odoo import models, fields, api, exceptions, _
+
+from .pricing import PRICING_FIELDS
+from .rental import _sel_range
+
+
+class BikeRentalGroup(models.Model):
+    """
+    Réservation de groupe : un seul contrat pour plusieurs vélos.
+    Les vélos libres sont attribués automatiquement (une requête pour tout le
+    groupe), les locations individuelles créées en un lot et facturées ensemble.
+    """
+    _name = "bike.rental.group"
+    _description = "Réservation de groupe"
+    _order = "start_date desc, name desc"
+
+    name = fields.Char(
+        string="Référence du contrat",
+        required=True,
+        copy=False,
+        readonly=True,
+        default="New"
+    )
+    customer_id = fields.Many2one(
+        "bike.customer",
+        string="Client",
+        required=True,
+        ondelete="restrict"
+    )
+
+    # Période (mêmes règles que bike.rental)
+    start_date = fields.Datetime(
+        string="Date de début",
+        required=True,
+        default=fields.Datetime.now
+    )
+    pricing_type = fields.Selection([
+        ("hourly", "Horaire"),
+        ("daily", "Journalier"),
+        ("weekly", "Hebdomadaire"),
+        ("monthly", "Mensuel")
+    ], string="Type de location", required=True, default="daily")
+    hours_qty = fields.Selection(_sel_range(1, 23), string="Heures", default="1")
+    days_qty = fields.Selection(_sel_range(1, 6), string="Jours", default="1")
+    weeks_qty = fields.Selection(_sel_range(1, 3), string="Semaines", default="1")
+    months_qty = fields.Selection(_sel_range(1, 24), string="Mois", default="1")
+    end_date = fields.Datetime(
+        string="Date de fin",
+        compute="_compute_end_date",
+        store=True,
+        readonly=True
+    )
+
+    # Vélos demandés et locations générées
+    line_ids = fields.One2many("bike.rental.group.line", "group_id", string="Vélos demandés")
+    rental_ids = fields.One2many("bike.rental", "group_id", string="Locations")
+    bike_count = fields.Integer(string="Nombre de vélos", compute="_compute_totals", store=True)
+    total_amount = fields.Float(string="Montant total", compute="_compute_totals", store=True)
+
+    state = fields.Selection([
+        ("draft", "Brouillon"),
+        ("confirmed", "Confirmée"),
+        ("ongoing", "En cours"),
+        ("returned", "Retournée"),
+        ("cancelled", "Annulée")
+    ], string="Statut", default="draft", required=True)
+
+    invoice_id = fields.Many2one("account.move", string="Facture", readonly=True, copy=False)
+    notes = fields.Text(string="Notes")
+    active = fields.Boolean(string="Actif", default=True)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env["ir.sequence"]._assign_block_references(vals_list, "name", "bike.rental.group")
+        return super().create(vals_list)
+
+    @api.depends("start_date", "pricing_type", "hours_qty", "days_qty", "weeks_qty", "months_qty")
+    def _compute_end_date(self):
+        Rental = self.env["bike.rental"]
+        for group in self:
+            qty_field = PRICING_FIELDS.get(group.pricing_type, (None, None))[0]
+            qty = float(group[qty_field] or "0") if qty_field else 0.0
+            group.end_date = Rental._calc_end_date(group.start_date, group.pricing_type, qty) if group.start_date else False
+
+    @api.depends("rental_ids", "rental_ids.total_amount", "rental_ids.state")
+    def _compute_totals(self):
+        for group in self:
+            rentals = group.rental_ids.filtered(lambda r: r.state != "cancelled")
+            group.bike_count = len(rentals)
+            group.total_amount = sum(rentals.mapped("total_amount"))
+
+    # -----------------------------
+    # ATTRIBUTION DES VÉLOS
+    # -----------------------------
+    def _allocate_bike_items(self, allocated_ids=()):
+        """
+        Choisit les vélos libres pour chaque ligne en une seule requête de
+        disponibilité. Toutes les pénuries sont signalées en une fois.
+        allocated_ids : vélos déjà attribués à d'autres groupes confirmés dans
+        la même opération (leurs locations ne sont pas encore créées).
+        Retourne [(ligne, vélos attribués)].
+        """
+        self.ensure_one()
+        free_by_product = {}
+        for item_id, product_id in self.env["bike.item"]._query_free_items(
+            self.start_date, self.end_date, product_ids=self.line_ids.product_id.ids
+        ):
+            if item_id not in allocated_ids:
+                free_by_product.setdefault(product_id, []).append(item_id)
+
+        allocation = []
+        shortages = []
+        for line in self.line_ids:
+            free_ids = free_by_product.get(line.product_id.id, [])
+            if len(free_ids) < line.quantity:
+                shortages.append(_("%(product)s : %(free)s libre(s), %(requested)s demandé(s)") % {
+                    "product": line.product_id.name,
+                    "free": len(free_ids),
+                    "requested": line.quantity,
+                })
+                continue
+            allocation.append((line, self.env["bike.item"].browse(free_ids[:line.quantity])))
+            free_by_product[line.product_id.id] = free_ids[line.quantity:]
+
+        if shortages:
+            raise exceptions.ValidationError(
+                _("Pas assez de vélos libres sur la période :\n") + "\n".join(shortages)
+            )
+        return allocation
+
+    def _prepare_rental_vals(self, bike_item):
+        self.ensure_one()
+        product = bike_item.product_id
+        qty_field, price_field = PRICING_FIELDS[self.pricing_type]
+        return {
+            "group_id": self.id,
+            "customer_id": self.customer_id.id,
+            "bike_item_id": bike_item.id,
+            "start_date": self.start_date,
+            "end_date": self.end_date,
+            "pricing_type": self.pricing_type,
+            qty_field: self[qty_field],
+            "unit_price": product[price_field],
+        }
+
+    # -----------------------------
+    # ACTIONS
+    # -----------------------------
+    def action_confirm(self):
+        """Attribue les vélos et crée toutes les locations du groupe en un lot"""
+        vals_list = []
+        allocated_ids = set()
+        for group in self:
+            if group.state != "draft":
+                raise exceptions.ValidationError(_("Seules les réservations en brouillon peuvent être confirmées !"))
+            if not group.line_ids:
+                raise exceptions.ValidationError(_("Ajoutez au moins un vélo à la réservation de groupe !"))
+            for _line, bike_items in group._allocate_bike_items(allocated_ids):
+                allocated_ids.update(bike_items.ids)
+                vals_list += [group._prepare_rental_vals(item) for item in bike_items]
+
+        self.env["bike.rental"].create(vals_list)
+        self.state = "confirmed"
+
+    def action_start_rental(self):
+        """Démarre toutes les locations du groupe"""
+        for group in self:
+            if group.state != "confirmed":
+                raise exceptions.ValidationError(_("Seules les réservations confirmées peuvent être démarrées !"))
+        self.rental_ids.filtered(lambda r: r.state == "draft").action_start_rental()
+        self.state = "ongoing"
+
+    def action_return_bike(self):
+        """Retour de tous les vélos du groupe"""
+        for group in self:
+            if group.state != "ongoing":
+                raise exceptions.ValidationError(_("Seules les réservations en cours peuvent être retournées !"))
+        self.rental_ids.filtered(lambda r: r.state == "ongoing").action_return_bike()
+        self.state = "returned"
+
+    def action_cancel(self):
+        """Annule la réservation et libère les vélos"""
+        for group in self:
+            if group.state == "returned":
+                raise exceptions.ValidationError(_("Impossible d'annuler une réservation retournée !"))
+        self.rental_ids.filtered(lambda r: r.state in ["draft", "ongoing"]).action_cancel()
+        self.state = "cancelled"
+
+    def action_create_invoice(self):
+        """Une seule facture par réservation de groupe"""
+        for group in self.filtered(lambda g: not g.invoice_id):
+            moves = group.rental_ids._create_invoices(grouped=True)
+            if len(moves) != 1:
+                # Locations déjà facturées une à une : la facture du groupe serait incomplète
+                raise exceptions.ValidationError(
+                    _("Impossible de créer une facture unique pour la réservation %s.") % group.name
+                )
+            group.invoice_id = moves.id
+        return self.action_view_invoice()
+
+    def action_view_invoice(self):
+        invoices = self.invoice_id
+        if not invoices:
+            raise exceptions.ValidationError(_("Aucune facture liée à cette réservation."))
+        if len(invoices) == 1:
+            return {
+                "type": "ir.actions.act_window",
+                "name": _("Facture"),
+                "res_model": "account.move",
+                "view_mode": "form",
+                "res_id": invoices.id,
+            }
+        return {
+            "type": "ir.actions.act_window",
+            "name": _("Factures"),
+            "res_model": "account.move",
+            "view_mode": "list,form",
+            "domain": [("id", "in", invoices.ids)],
+        }
+
+
+class BikeRentalGroupLine(models.Model):
+    """
+    Ligne de réservation de groupe : un produit et un nombre de vélos
+    """
+    _name = "bike.rental.group.line"
+    _description = "Ligne de réservation de groupe"
+    _order = "group_id, id"
+
+    group_id = fields.Many2one("bike.rental.group", string="Réservation", required=True, ondelete="cascade")
+    product_id = fields.Many2one(
+        "bike.product",
+        string="Modèle de vélo",
+        required=True,
+        ondelete="restrict",
+        domain="[('product_type', '=', 'bike'), ('can_be_rented', '=', True)]"
+    )
+    quantity = fields.Integer(string="Nombre de vélos", required=True, default=1)
+
+    _check_quantity = models.Constraint("CHECK(quantity > 0)", "Le nombre de vélos doit être positif !")
@@ -0,0 +1,247 @@
+import logging
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+
+class BikeReportMixin(models.AbstractModel):
+    """
+    Rapports en lecture seule adossés à une vue matérialisée PostgreSQL.
+    Les agrégats mensuels sont calculés une fois (installation, mise à jour,
+    tâche planifiée) : les tableaux de bord pluriannuels ne parcourent plus
+    les tables de ventes et de locations.
+
+    Chaque rapport définit _report_query, la requête SQL de la vue. Les
+    ratios (prix moyen, taux d'occupation) déclarés dans _report_ratios sont
+    regroupés à partir de leur numérateur et de leur dénominateur sommés : une
+    moyenne de moyennes fausserait les totaux du tableau croisé.
+    """
+    _name = "bike.report.mixin"
+    _description = "Rapport matérialisé"
+    _auto = False
+    # Colonnes identifiant une ligne du rapport (index unique, requis par REFRESH CONCURRENTLY)
+    _report_key = ()
+    # Requête SQL de la vue (obligatoire) ; doit fournir une colonne id unique et stable
+    _report_query = None
+    # Ratios regroupés : {champ: (numérateur, dénominateur, facteur)}
+    _report_ratios = {}
+
+    def init(self):
+        if self._abstract:
+            return
+        if not self._report_query:
+            raise TypeError(f"{self._name} : _report_query n'est pas défini")
+        cr = self.env.cr
+        cr.execute("SELECT relkind FROM pg_class WHERE relname = %s", [self._table])
+        row = cr.fetchone()
+        if row:
+            kind = "MATERIALIZED VIEW" if row[0] == "m" else "VIEW"
+            cr.execute(f"DROP {kind} {self._table} CASCADE")
+        cr.execute(f"CREATE MATERIALIZED VIEW {self._table} AS ({self._report_query})")
+        cr.execute(f"CREATE UNIQUE INDEX {self._table}_id_idx ON {self._table} (id)")
+        if self._report_key:
+            cr.execute(f"CREATE UNIQUE INDEX {self._table}_key_idx ON {self._table} ({', '.join(self._report_key)})")
+        cr.execute(f"CREATE INDEX {self._table}_date_idx ON {self._table} (date)")
+
+    @api.model
+    def _read_group(self, domain, groupby=(), aggregates=(), having=(), offset=0, limit=None, order=None):
+        """Les agrégats d'un ratio valent somme(numérateur) × facteur / somme(dénominateur) du groupe"""
+        ratios = {
+            spec: self._report_ratios[spec.split(":")[0]]
+            for spec in aggregates
+            if spec.split(":")[0] in self._report_ratios
+        }
+        if not ratios:
+            return super()._read_group(domain, groupby, aggregates, having, offset, limit, order)
+        query_aggregates = [spec for spec in aggregates if spec not in ratios]
+        for numerator, denominator, _factor in ratios.values():
+            for spec in (f"{numerator}:sum", f"{denominator}:sum"):
+                if spec not in query_aggregates:
+                    query_aggregates.append(spec)
+        rows = super()._read_group(domain, groupby, query_aggregates, having, offset, limit, order)
+        result = []
+        for row in rows:
+            values = dict(zip(query_aggregates, row[len(groupby):]))
+            aggregated = []
+            for spec in aggregates:
+                if spec in ratios:
+                    numerator, denominator, factor = ratios[spec]
+                    total = values[f"{denominator}:sum"]
+                    aggregated.append(values[f"{numerator}:sum"] * factor / total if total else 0.0)
+                else:
+                    aggregated.append(values[spec])
+            result.append((*row[:len(groupby)], *aggregated))
+        return result
+
+    def _refresh_report(self):
+        """Recalcule la vue sans bloquer les lectures en cours"""
+        self.env.cr.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {self._table}")
+        self.invalidate_model()
+
+    @api.model
+    def _cron_refresh_reports(self):
+        """Rafraîchit tous les rapports matérialisés du module"""
+        # Les données saisies dans la transaction courante doivent y figurer
+        self.env.flush_all()
+        for model_name in sorted(self.env.registry.descendants([self._name], "_inherit")):
+            report = self.env[model_name]
+            if report._abstract:
+                continue
+            report._refresh_report()
+            _logger.info("Rapport %s rafraîchi", model_name)
+
+
+class BikeReportSale(models.Model):
+    """Ventes confirmées par mois, produit et canal"""
+    _name = "bike.report.sale"
+    _inherit = ["bike.report.mixin"]
+    _description = "Analyse des ventes"
+    _auto = False
+    _order = "date desc, product_id"
+    _report_key = ("date", "product_id", "channel")
+    _report_ratios = {"average_price": ("amount", "quantity", 1.0)}
+
+    date = fields.Date(string="Mois", readonly=True)
+    product_id = fields.Many2one("bike.product", string="Produit", readonly=True)
+    category_id = fields.Many2one("bike.category", string="Catégorie", readonly=True)
+    product_type = fields.Selection([
+        ('bike', 'Vélo'),
+        ('accessory', 'Accessoire'),
+        ('part', 'Pièce'),
+    ], string="Type de produit", readonly=True)
+    channel = fields.Selection([
+        ('shop', 'Magasin'),
+        ('web', 'Site web'),
+        ('phone', 'Téléphone'),
+    ], string="Canal", readonly=True)
+    quantity = fields.Integer(string="Quantité vendue", readonly=True)
+    amount = fields.Float(string="Chiffre d'affaires HT", readonly=True)
+    order_count = fields.Integer(string="Commandes", readonly=True)
+    average_price = fields.Float(string="Prix moyen", readonly=True, aggregator="avg")
+
+    # Identifiant : première ligne de commande du groupe (stable d'un rafraîchissement à l'autre)
+    _report_query = """
+            SELECT MIN(l.id) AS id,
+                   date_trunc('month', o.date)::date AS date,
+                   l.product_id,
+                   p.category_id,
+                   p.product_type,
+                   o.channel,
+                   SUM(l.quantity) AS quantity,
+                   SUM(l.subtotal) AS amount,
+                   COUNT(DISTINCT o.id) AS order_count,
+                   SUM(l.subtotal) / NULLIF(SUM(l.quantity), 0) AS average_price
+              FROM bike_sale_order_line l
+              JOIN bike_sale_order o ON o.id = l.order_id
+              JOIN bike_product p ON p.id = l.product_id
+             WHERE o.active
+               AND o.state IN ('confirmed', 'done')
+          GROUP BY date_trunc('month', o.date), l.product_id, p.category_id, p.product_type, o.channel
+    """
+
+
+class BikeReportOccupancy(models.Model):
+    """Taux d'occupation mensuel des vélos de location (créneaux bike.item.occupancy)"""
+    _name = "bike.report.occupancy"
+    _inherit = ["bike.report.mixin"]
+    _description = "Taux d'occupation"
+    _auto = False
+    _order = "date desc, bike_item_id"
+    _report_key = ("date", "bike_item_id")
+    _report_ratios = {"occupancy_rate": ("booked_hours", "available_hours", 100.0)}
+
+    date = fields.Date(string="Mois", readonly=True)
+    bike_item_id = fields.Many2one("bike.item", string="Vélo individuel", readonly=True)
+    product_id = fields.Many2one("bike.product", string="Modèle de vélo", readonly=True)
+    category_id = fields.Many2one("bike.category", string="Catégorie", readonly=True)
+    booked_hours = fields.Float(string="Heures réservées", readonly=True)
+    available_hours = fields.Float(string="Heures disponibles", readonly=True)
+    occupancy_rate = fields.Float(string="Taux d'occupation (%)", readonly=True, aggregator="avg")
+    rental_count = fields.Integer(string="Locations", readonly=True)
+
+    # Une ligne par vélo louable et par mois, y compris les mois sans réservation
+    # (à partir de sa création) ; identifiant = vélo × mois
+    _report_query = """
+            WITH slots AS (
+                SELECT bike_item_id,
+                       date_trunc('month', day)::date AS month,
+                       SUM(booked_hours) AS booked_hours,
+                       COUNT(DISTINCT rental_id) AS rental_count
+                  FROM bike_item_occupancy
+              GROUP BY bike_item_id, date_trunc('month', day)
+            ), months AS (
+                SELECT generate_series(
+                           MIN(month),
+                           GREATEST(MAX(month), date_trunc('month', now() AT TIME ZONE 'UTC')::date),
+                           interval '1 month'
+                       )::date AS month
+                  FROM slots
+            )
+            SELECT b.id::bigint * 100000 + EXTRACT(YEAR FROM m.month)::int * 12 + EXTRACT(MONTH FROM m.month)::int AS id,
+                   m.month AS date,
+                   b.id AS bike_item_id,
+                   b.product_id,
+                   p.category_id,
+                   COALESCE(s.booked_hours, 0) AS booked_hours,
+                   EXTRACT(EPOCH FROM (m.month + interval '1 month') - m.month) / 3600.0 AS available_hours,
+                   COALESCE(s.booked_hours, 0) * 100.0
+                       / (EXTRACT(EPOCH FROM (m.month + interval '1 month') - m.month) / 3600.0) AS occupancy_rate,
+                   COALESCE(s.rental_count, 0) AS rental_count
+              FROM bike_item b
+              JOIN bike_product p ON p.id = b.product_id
+        CROSS JOIN months m
+         LEFT JOIN slots s ON s.bike_item_id = b.id AND s.month = m.month
+             WHERE b.active
+               AND b.usage_type IN ('rental', 'both')
+               AND (s.bike_item_id IS NOT NULL OR m.month >= date_trunc('month', b.create_date)::date)
+    """
+
+
+class BikeReportRental(models.Model):
+    """Revenus de location par mois de début, modèle et type de tarif"""
+    _name = "bike.report.rental"
+    _inherit = ["bike.report.mixin"]
+    _description = "Revenus de location"
+    _auto = False
+    _order = "date desc, product_id"
+    _report_key = ("date", "product_id", "pricing_type", "state")
+    _report_ratios = {"average_amount": ("revenue", "rental_count", 1.0)}
+
+    date = fields.Date(string="Mois", readonly=True)
+    product_id = fields.Many2one("bike.product", string="Modèle de vélo", readonly=True)
+    category_id = fields.Many2one("bike.category", string="Catégorie", readonly=True)
+    pricing_type = fields.Selection([
+        ("hourly", "Horaire"),
+        ("daily", "Journalier"),
+        ("weekly", "Hebdomadaire"),
+        ("monthly", "Mensuel")
+    ], string="Type de location", readonly=True)
+    state = fields.Selection([
+        ("draft", "Brouillon"),
+        ("ongoing", "En cours"),
+        ("returned", "Retournée"),
+    ], string="Statut", readonly=True)
+    rental_count = fields.Integer(string="Locations", readonly=True)
+    rental_hours = fields.Float(string="Heures louées", readonly=True)
+    revenue = fields.Float(string="Revenus", readonly=True)
+    average_amount = fields.Float(string="Montant moyen", readonly=True, aggregator="avg")
+
+    # Identifiant : première location du groupe
+    _report_query = """
+            SELECT MIN(r.id) AS id,
+                   date_trunc('month', r.start_date)::date AS date,
+                   r.product_id,
+                   p.category_id,
+                   r.pricing_type,
+                   r.state,
+                   COUNT(*) AS rental_count,
+                   SUM(EXTRACT(EPOCH FROM r.end_date - r.start_date) / 3600.0) AS rental_hours,
+                   SUM(r.total_amount) AS revenue,
+                   AVG(r.total_amount) AS average_amount
+              FROM bike_rental r
+              JOIN bike_product p ON p.id = r.product_id
+             WHERE r.active
+               AND r.state != 'cancelled'
+          GROUP BY date_trunc('month', r.start_date), r.product_id, p.category_id, r.pricing_type, r.state
+    """
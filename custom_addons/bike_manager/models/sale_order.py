@@ -1,6 +1,18 @@
-from odoo import models, fields, api, exceptions, _
+from collections import defaultdict
+from itertools import groupby
+
+from odoo import models, fields, api, exceptions, Command, _
+from odoo.tools import email_normalize, split_every
 from datetime import datetime
 
+from .customer import COUNTED_SALE_STATES
+from .importing import IMPORT_CHUNK_SIZE, to_float, to_int, to_selection
+
+# Champs de commande dont dépendent les statistiques client (nombre / montant)
+CUSTOMER_STAT_FIELDS = {"customer_id", "state", "active", "order_line_ids"}
+# Champs de ligne qui modifient le montant de la commande
+LINE_STAT_FIELDS = {"order_id", "quantity", "unit_price", "discount"}
+
 
 class BikeSaleOrder(models.Model):
     """
@@ -8,10 +20,11 @@ class BikeSaleOrder(models.Model):
     """
     _name = "bike.sale.order"
     _description = "Commande de vente"
+    _inherit = ["bike.accounting.mixin"]
     _order = "date desc, name desc"
 
     name = fields.Char(string="Référence de commande", required=True, copy=False, readonly=True, default='New')
-    customer_id = fields.Many2one('bike.customer', string="Client", required=True, ondelete='restrict')
+    customer_id = fields.Many2one('bike.customer', string="Client", required=True, ondelete='restrict', index=True)
     date = fields.Datetime(string="Date de commande", required=True, default=fields.Datetime.now)
 
     # Lignes de commande
@@ -40,16 +53,54 @@ class BikeSaleOrder(models.Model):
     is_paid = fields.Boolean(string="Payée", default=False)
     payment_date = fields.Date(string="Date de paiement")
 
+    # Origine de la commande (imports quotidiens web / téléphone)
+    channel = fields.Selection([
+        ('shop', 'Magasin'),
+        ('web', 'Site web'),
+        ('phone', 'Téléphone'),
+    ], string="Canal", default='shop', required=True)
+    external_ref = fields.Char(string="Référence externe", copy=False, readonly=True,
+                               help="Référence de la commande dans le canal d'origine (import)")
+
     notes = fields.Text(string="Notes")
     active = fields.Boolean(string="Actif", default=True)
 
-    @api.model
+    _external_ref_unique = models.Constraint(
+        'unique(channel, external_ref)',
+        'Une commande avec cette référence externe existe déjà pour ce canal !',
+    )
+
+    @api.model_create_multi
     def create(self, vals_list):
         """Génère la référence de commande à la création"""
-        for vals in vals_list:
-            if vals.get('name', 'New') == 'New':
-                vals['name'] = self.env['ir.sequence'].next_by_code('bike.sale.order') or 'New'
-        return super(BikeSaleOrder, self).create(vals_list)
+        self.env['ir.sequence']._assign_block_references(vals_list, 'name', 'bike.sale.order')
+        # Les lignes créées avec la commande sont comptées au niveau de la commande
+        orders = super(BikeSaleOrder, self.with_context(bike_skip_line_stats=True)).create(vals_list)
+        orders = orders.with_env(self.env)
+        self.env['bike.customer']._apply_stat_changes('sale', {}, orders._get_customer_stat_values())
+        return orders
+
+    def write(self, vals):
+        stats_before = self._get_customer_stat_values() if CUSTOMER_STAT_FIELDS.intersection(vals) else None
+        res = super(BikeSaleOrder, self.with_context(bike_skip_line_stats=True)).write(vals)
+        # Statistiques client : seule la différence est appliquée
+        if stats_before is not None:
+            self.env['bike.customer']._apply_stat_changes('sale', stats_before, self._get_customer_stat_values())
+        return res
+
+    def unlink(self):
+        stats_before = self._get_customer_stat_values()
+        res = super().unlink()
+        self.env['bike.customer']._apply_stat_changes('sale', stats_before, {})
+        return res
+
+    def _get_customer_stat_values(self):
+        """Contribution de chaque commande aux statistiques client : {id: (client, nombre, montant)}"""
+        return {
+            order.id: (order.customer_id.id, 1, order.total_amount or 0.0)
+            if order.active and order.state in COUNTED_SALE_STATES else (order.customer_id.id, 0, 0.0)
+            for order in self
+        }
 
     @api.depends('order_line_ids', 'order_line_ids.subtotal')
     def _compute_amounts(self):
@@ -59,29 +110,173 @@ class BikeSaleOrder(models.Model):
             order.tax_amount = order.subtotal * 0.21  # TVA 21%
             order.total_amount = order.subtotal + order.tax_amount
 
-    def action_confirm(self):
-        """Confirme la commande et met à jour le stock"""
-        for order in self:
-            if not order.order_line_ids:
-                raise exceptions.ValidationError(_("Impossible de confirmer une commande sans lignes !"))
+    # ----------------------------
+    # Import des commandes (fichiers quotidiens web / téléphone)
+    # ----------------------------
+    @api.model
+    def _import_order_stream(self, rows, channel, chunk_size=IMPORT_CHUNK_SIZE):
+        """
+        Importe des commandes depuis un flux de lignes (une ligne de fichier par
+        ligne de commande, les lignes d'une commande étant consécutives).
 
-            # Vérifier la disponibilité du stock
-            for line in order.order_line_ids:
-                if line.product_id.stock_quantity < line.quantity:
-                    raise exceptions.ValidationError(_(
-                        "Stock insuffisant pour le produit %(product)s. "
-                        "Disponible : %(available)s, Demandé : %(requested)s"
-                    ) % {
-                        'product': line.product_id.name,
-                        'available': line.product_id.stock_quantity,
-                        'requested': line.quantity,
-                    })
-
-            # Mise à jour du stock
+        Colonnes : external_ref, date, customer_email, product_reference,
+        quantity, unit_price (défaut : prix de vente), discount, payment_method.
+
+        Les commandes sont créées par paquets (un create() avec les lignes
+        imbriquées, donc un seul calcul des montants par paquet) ; les commandes
+        déjà importées pour ce canal sont ignorées. Une commande dont une ligne
+        est invalide est signalée (numéro de ligne) et ignorée, sans interrompre
+        l'import.
+        Retourne {'created': n, 'skipped': n, 'errors': [messages]}.
+        """
+        result = {'created': 0, 'skipped': 0, 'errors': []}
+        # Lignes numérotées (1 = premier enregistrement du fichier) pour les messages d'erreur
+        orders = (
+            list(order_rows)
+            for _ref, order_rows in groupby(
+                enumerate(rows, start=1), key=lambda item: str(item[1].get('external_ref') or '').strip()
+            )
+        )
+        for chunk in split_every(chunk_size, orders, list):
+            self._import_order_chunk(chunk, channel, result)
+        return result
+
+    @api.model
+    def _import_order_chunk(self, chunk, channel, result):
+        """
+        Importe un paquet de commandes : clients et produits résolus en une
+        requête chacun. chunk : liste de commandes, chacune étant une liste de
+        (numéro de ligne, ligne).
+        """
+        refs = [str(order_rows[0][1].get('external_ref') or '').strip() for order_rows in chunk]
+        existing = set(self.with_context(active_test=False).search([
+            ('channel', '=', channel), ('external_ref', 'in', [ref for ref in refs if ref]),
+        ]).mapped('external_ref'))
+
+        emails = {email_normalize(row.get('customer_email') or '') for order_rows in chunk for _line, row in order_rows}
+        emails.discard(False)
+        customers = {
+            email_normalize(customer.email): customer.id
+            for customer in self.env['bike.customer'].search([('email', 'in', list(emails))])
+        } if emails else {}
+
+        references = {
+            str(row.get('product_reference') or '').strip() for order_rows in chunk for _line, row in order_rows
+        }
+        products = {
+            product.reference: product
+            for product in self.env['bike.product'].with_context(active_test=False).search(
+                [('reference', 'in', list(references))]
+            )
+        }
+
+        vals_list = []
+        for ref, order_rows in zip(refs, chunk):
+            first_line, first = order_rows[0]
+            if not ref:
+                result['errors'].append(_("Ligne %s : référence externe manquante, ignorée") % first_line)
+                continue
+            if ref in existing:
+                result['skipped'] += 1
+                continue
+            customer_id = customers.get(email_normalize(first.get('customer_email') or ''))
+            if not customer_id:
+                result['errors'].append(_("%(ref)s : client inconnu (%(email)s)") % {
+                    'ref': ref, 'email': first.get('customer_email') or '',
+                })
+                continue
+
+            missing = [
+                row.get('product_reference') or '' for _line, row in order_rows
+                if str(row.get('product_reference') or '').strip() not in products
+            ]
+            if missing:
+                result['errors'].append(_("%(ref)s : produit inconnu (%(product)s)") % {
+                    'ref': ref, 'product': ", ".join(missing),
+                })
+                continue
+
+            vals = {
+                'customer_id': customer_id,
+                'channel': channel,
+                'external_ref': ref,
+                'order_line_ids': [],
+            }
+            line = first_line
+            try:
+                for line, row in order_rows:
+                    vals['order_line_ids'].append(Command.create(self._prepare_import_line_vals(
+                        row, products[str(row.get('product_reference')).strip()]
+                    )))
+                line = first_line
+                if first.get('date'):
+                    vals['date'] = fields.Datetime.to_datetime(first['date'])
+                vals['payment_method'] = to_selection(
+                    first.get('payment_method'), self._fields['payment_method'], self.env
+                )
+            except (ValueError, exceptions.ValidationError) as e:
+                result['errors'].append(_("Ligne %(line)s (%(ref)s) : %(error)s") % {
+                    'line': line, 'ref': ref, 'error': e,
+                })
+                continue
+            vals_list.append(vals)
+            existing.add(ref)
+
+        if vals_list:
+            self.create(vals_list)
+            result['created'] += len(vals_list)
+        # Libère le cache entre deux paquets (fichiers de plusieurs dizaines de milliers de commandes)
+        self.env.flush_all()
+        self.env.invalidate_all()
+
+    @api.model
+    def _prepare_import_line_vals(self, row, product):
+        """
+        Valeurs d'une ligne de commande importée (prix de vente du produit par
+        défaut) ; ValueError si une valeur est invalide.
+        """
+        quantity = to_int(row.get('quantity'), 1)
+        if quantity <= 0:
+            raise ValueError(_("quantité invalide : %s") % quantity)
+        unit_price = to_float(row.get('unit_price'), product.sale_price)
+        discount = to_float(row.get('discount'), 0.0)
+        if unit_price < 0 or not 0 <= discount <= 100:
+            raise ValueError(_("prix ou remise invalide"))
+        return {
+            'product_id': product.id,
+            'description': row.get('description') or product.description,
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'discount': discount,
+        }
+
+    def _prepare_stock_moves(self, sign, move_type):
+        """Mouvements de stock des commandes : un par commande et par produit"""
+        vals_list = []
+        for order in self:
+            quantities = defaultdict(int)
             for line in order.order_line_ids:
-                line.product_id.stock_quantity -= line.quantity
+                quantities[line.product_id.id] += line.quantity
+            vals_list += [
+                {
+                    'product_id': product_id,
+                    'quantity': sign * quantity,
+                    'move_type': move_type,
+                    'sale_order_id': order.id,
+                    'note': order.name,
+                }
+                for product_id, quantity in quantities.items()
+            ]
+        return vals_list
 
-            order.state = 'confirmed'
+    def action_confirm(self):
+        """Confirme la commande et met à jour le stock"""
+        if any(not order.order_line_ids for order in self):
+            raise exceptions.ValidationError(_("Impossible de confirmer une commande sans lignes !"))
+
+        # Vérification et sortie de stock en une opération pour tout le lot
+        self.env['bike.stock.move']._register_moves(self._prepare_stock_moves(-1, 'sale'))
+        self.write({'state': 'confirmed'})
 
     def action_done(self):
         """Marque la commande comme terminée"""
@@ -92,16 +287,13 @@ class BikeSaleOrder(models.Model):
 
     def action_cancel(self):
         """Annule la commande et restaure le stock si nécessaire"""
-        for order in self:
-            if order.state == 'done':
-                raise exceptions.ValidationError(_("Impossible d’annuler une commande terminée !"))
-
-            # Restaurer le stock si la commande était confirmée
-            if order.state == 'confirmed':
-                for line in order.order_line_ids:
-                    line.product_id.stock_quantity += line.quantity
+        if any(order.state == 'done' for order in self):
+            raise exceptions.ValidationError(_("Impossible d’annuler une commande terminée !"))
 
-            order.state = 'cancelled'
+        # Restaurer le stock des commandes confirmées
+        confirmed = self.filtered(lambda o: o.state == 'confirmed')
+        self.env['bike.stock.move']._register_moves(confirmed._prepare_stock_moves(1, 'sale_cancel'))
+        self.write({'state': 'cancelled'})
 
     def action_set_draft(self):
         """Remet la commande en brouillon"""
@@ -120,8 +312,8 @@ class BikeSaleOrderLine(models.Model):
     _order = "order_id, sequence, id"
 
     sequence = fields.Integer(string="Séquence", default=10)
-    order_id = fields.Many2one('bike.sale.order', string="Commande", required=True, ondelete='cascade')
-    product_id = fields.Many2one('bike.product', string="Produit", required=True, ondelete='restrict')
+    order_id = fields.Many2one('bike.sale.order', string="Commande", required=True, ondelete='cascade', index=True)
+    product_id = fields.Many2one('bike.product', string="Produit", required=True, ondelete='restrict', index=True)
 
     description = fields.Text(string="Description")
     quantity = fields.Integer(string="Quantité", required=True, default=1)
@@ -129,6 +321,36 @@ class BikeSaleOrderLine(models.Model):
     discount = fields.Float(string="Remise (%)", default=0.0)
     subtotal = fields.Float(string="Sous-total", compute='_compute_subtotal', store=True)
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        if self.env.context.get('bike_skip_line_stats'):
+            return super().create(vals_list)
+        orders = self.env['bike.sale.order'].browse({vals['order_id'] for vals in vals_list if vals.get('order_id')})
+        stats_before = orders._get_customer_stat_values()
+        lines = super().create(vals_list)
+        self.env['bike.customer']._apply_stat_changes('sale', stats_before, orders._get_customer_stat_values())
+        return lines
+
+    def write(self, vals):
+        if self.env.context.get('bike_skip_line_stats') or not LINE_STAT_FIELDS.intersection(vals):
+            return super().write(vals)
+        # Ancienne et éventuelle nouvelle commande
+        orders = self.order_id | self.env['bike.sale.order'].browse(vals.get('order_id'))
+        stats_before = orders._get_customer_stat_values()
+        res = super().write(vals)
+        self.env['bike.customer']._apply_stat_changes('sale', stats_before, orders._get_customer_stat_values())
+        return res
+
+    def unlink(self):
+        if self.env.context.get('bike_skip_line_stats'):
+            return super().unlink()
+        orders = self.order_id
+        stats_before = orders._get_customer_stat_values()
+        res = super().unlink()
+        orders = orders.exists()
+        self.env['bike.customer']._apply_stat_changes('sale', stats_before, orders._get_customer_stat_values())
+        return res
+
     @api.depends('quantity', 'unit_price', 'discount')
     def _compute_subtotal(self):
         """Calcule le sous-total de la ligne"""
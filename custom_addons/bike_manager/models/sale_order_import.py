@@ -0,0 +1,44 @@
+from odoo import models, fields, _
+
+from .importing import IMPORT_CHUNK_SIZE, IMPORT_FORMATS, guess_format, iter_rows, open_binary_field
+
+
+class BikeSaleOrderImport(models.TransientModel):
+    """
+    Assistant d'import des fichiers de commandes (site web, téléphone)
+    """
+    _name = "bike.sale.order.import"
+    _description = "Import de commandes de vente"
+
+    file = fields.Binary(string="Fichier", required=True)
+    filename = fields.Char(string="Nom du fichier")
+    file_format = fields.Selection(IMPORT_FORMATS, string="Format",
+                                   help="Déduit de l'extension du fichier si non renseigné")
+    channel = fields.Selection([
+        ('web', 'Site web'),
+        ('phone', 'Téléphone'),
+    ], string="Canal", required=True, default='web')
+    chunk_size = fields.Integer(string="Commandes par paquet", default=IMPORT_CHUNK_SIZE)
+
+    def action_import(self):
+        self.ensure_one()
+        rows = iter_rows(open_binary_field(self.file), self.file_format or guess_format(self.filename))
+        result = self.env['bike.sale.order']._import_order_stream(
+            rows, self.channel, chunk_size=max(self.chunk_size, 1)
+        )
+        message = _("%(created)s commande(s) importée(s), %(skipped)s déjà présente(s).") % result
+        if result['errors']:
+            message += "\n" + "\n".join(result['errors'][:20])
+            if len(result['errors']) > 20:
+                message += "\n" + _("… et %s autre(s) erreur(s)") % (len(result['errors']) - 20)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Import des commandes"),
+                'message': message,
+                'type': 'warning' if result['errors'] else 'success',
+                'sticky': bool(result['errors']),
+                'next': {'type': 'ir.actions.act_window_close'},
+            },
+        }
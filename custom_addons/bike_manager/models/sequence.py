@@ -0,0 +1,59 @@
+from odoo import models, api
+
+
+class IrSequence(models.Model):
+    _inherit = "ir.sequence"
+
+    @api.model
+    def next_block_by_code(self, sequence_code, count):
+        """
+        Réserve un bloc de `count` références consécutives en un seul aller-retour
+        (et un seul verrou pour les séquences sans trou) au lieu d'un
+        next_by_code par enregistrement. Les références restent uniques et
+        croissantes. Retourne une liste de références (vide si séquence absente).
+        """
+        if count <= 0:
+            return []
+        self.browse().check_access("read")
+        company_id = self.env.company.id
+        sequence = self.sudo().search(
+            [("code", "=", sequence_code), ("company_id", "in", [company_id, False])],
+            order="company_id", limit=1,
+        )
+        if not sequence:
+            return []
+        if sequence.use_date_range:
+            # Séquences par période : on garde le comportement standard
+            return [sequence._next() for _i in range(count)]
+
+        if sequence.implementation == "standard":
+            self.env.cr.execute(
+                "SELECT nextval(%s) FROM generate_series(1, %s) ORDER BY 1",
+                ["ir_sequence_%03d" % sequence.id, count],
+            )
+            numbers = [row[0] for row in self.env.cr.fetchall()]
+        else:
+            # no_gap : un seul verrou de ligne pour tout le bloc
+            self.env.cr.execute("""
+                UPDATE ir_sequence
+                   SET number_next = number_next + number_increment * %s
+                 WHERE id = %s
+             RETURNING number_next - number_increment * %s, number_increment
+            """, [count, sequence.id, count])
+            first, increment = self.env.cr.fetchone()
+            sequence.invalidate_recordset(["number_next"])
+            numbers = [first + i * increment for i in range(count)]
+
+        return [sequence.get_next_char(number) for number in numbers]
+
+    @api.model
+    def _assign_block_references(self, vals_list, field_name, sequence_code, placeholders=("New",)):
+        """Remplit `field_name` des valeurs sans référence avec un bloc réservé d'un coup."""
+        pending = [vals for vals in vals_list if vals.get(field_name, placeholders[0]) in placeholders]
+        if not pending:
+            return
+        references = self.next_block_by_code(sequence_code, len(pending))
+        for vals, reference in zip(pending, references):
+            vals[field_name] = reference
+        for vals in pending[len(references):]:
+            vals[field_name] = placeholders[0]
@@ -0,0 +1,234 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import models, fields, api, exceptions, _
+from odoo.tools.sql import create_index
+
+# Les instantanés s'arrêtent un peu avant « maintenant » pour ne pas ignorer
+# un mouvement inséré par une transaction encore ouverte
+SNAPSHOT_MARGIN = timedelta(hours=1)
+
+
+class BikeStockMove(models.Model):
+    """
+    Mouvements de stock des produits (journal en ajout seul).
+    Le stock d'un produit est la somme de ses mouvements : les ventes, annulations
+    et ajustements insèrent une ligne au lieu de modifier le produit. Le total
+    courant est tenu dans bike.stock.level, mis à jour à chaque insertion.
+    """
+    _name = "bike.stock.move"
+    _description = "Mouvement de stock"
+    _order = "date desc, id desc"
+
+    product_id = fields.Many2one("bike.product", string="Produit", required=True, ondelete="cascade")
+    date = fields.Datetime(string="Date", required=True, readonly=True, default=fields.Datetime.now)
+    quantity = fields.Integer(string="Quantité", required=True,
+                              help="Positive pour une entrée en stock, négative pour une sortie")
+    move_type = fields.Selection([
+        ("initial", "Stock initial"),
+        ("adjustment", "Ajustement d'inventaire"),
+        ("sale", "Vente"),
+        ("sale_cancel", "Annulation de vente"),
+    ], string="Type", required=True, default="adjustment")
+    sale_order_id = fields.Many2one("bike.sale.order", string="Commande", ondelete="set null", index="btree_not_null")
+    note = fields.Char(string="Note")
+
+    def init(self):
+        create_index(self.env.cr, "bike_stock_move_product_date_idx", self._table, ["product_id", "date"])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        moves = super().create(vals_list)
+        deltas = defaultdict(int)
+        for move in moves:
+            deltas[move.product_id.id] += move.quantity
+        levels = self.env["bike.stock.level"]._add_quantities(deltas)
+        # L'état d'un produit (« Vendu » à stock nul) ne change que si son stock passe par zéro
+        crossed = [pid for pid, quantity in levels.items() if (quantity == 0) != (quantity - deltas[pid] == 0)]
+        if crossed:
+            Product = self.env["bike.product"]
+            self.env.add_to_compute(Product._fields["state"], Product.browse(crossed))
+        return moves
+
+    def write(self, vals):
+        raise exceptions.UserError(_(
+            "Les mouvements de stock ne peuvent pas être modifiés : enregistrez un mouvement correctif."
+        ))
+
+    def unlink(self):
+        raise exceptions.UserError(_(
+            "Les mouvements de stock ne peuvent pas être supprimés : enregistrez un mouvement correctif."
+        ))
+
+    @api.model
+    def _lock_products(self, product_ids):
+        """
+        Verrouille les niveaux de stock des produits, par id croissant (pas
+        d'interblocage), et retourne le stock courant {produit: quantité}.
+        Tout mouvement met à jour le niveau de son produit : en lecture répétable,
+        une transaction concurrente qui l'a modifié fait échouer ce verrou en
+        erreur de sérialisation (rejouée par Odoo) au lieu de laisser contrôler
+        le stock sur un instantané périmé. La ligne du produit n'est pas touchée.
+        """
+        self.env.cr.execute("""
+            SELECT product_id, quantity
+              FROM bike_stock_level
+             WHERE product_id IN %s
+          ORDER BY product_id
+               FOR UPDATE
+        """, [tuple(set(product_ids))])
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _register_moves(self, vals_list):
+        """
+        Enregistre un lot de mouvements. Les produits dont le stock diminue sont
+        verrouillés puis contrôlés ; tous les manques sont signalés en une fois.
+        """
+        vals_list = [vals for vals in vals_list if vals.get("quantity")]
+        demand = defaultdict(int)
+        for vals in vals_list:
+            if vals["quantity"] < 0:
+                demand[vals["product_id"]] -= vals["quantity"]
+
+        if demand:
+            stock = self._lock_products(demand)
+            shortages = [product_id for product_id, quantity in demand.items() if stock.get(product_id, 0) < quantity]
+            if shortages:
+                details = [
+                    _("%(product)s — Disponible : %(available)s, Demandé : %(requested)s") % {
+                        "product": product.name,
+                        "available": stock.get(product.id, 0),
+                        "requested": demand[product.id],
+                    }
+                    for product in self.env["bike.product"].browse(sorted(shortages))
+                ]
+                raise exceptions.ValidationError(_("Stock insuffisant :\n%s") % "\n".join(details))
+
+        return self.create(vals_list)
+
+
+class BikeStockLevel(models.Model):
+    """
+    Stock courant par produit (somme de tous ses mouvements), dans une table
+    distincte du produit : les mouvements d'un même produit se sérialisent sur
+    cette ligne sans réécrire la fiche produit lue par toutes les vues.
+    """
+    _name = "bike.stock.level"
+    _description = "Niveau de stock"
+    _log_access = False
+
+    product_id = fields.Many2one("bike.product", string="Produit", required=True, readonly=True, ondelete="cascade")
+    quantity = fields.Integer(string="Quantité", readonly=True)
+
+    # Requise par l'INSERT ... ON CONFLICT de _add_quantities
+    _product_unique = models.Constraint("unique(product_id)", "Un seul niveau de stock par produit !")
+
+    def init(self):
+        # Resynchronisation depuis le journal à chaque mise à jour du module
+        self.env.cr.execute("""
+            DELETE FROM bike_stock_level;
+            INSERT INTO bike_stock_level (product_id, quantity)
+                 SELECT product_id, SUM(quantity)
+                   FROM bike_stock_move
+               GROUP BY product_id
+        """)
+        # État stocké des produits recalculé depuis les niveaux
+        Product = self.env["bike.product"].with_context(active_test=False)
+        self.env.add_to_compute(Product._fields["state"], Product.search([]))
+
+    @api.model
+    def _add_quantities(self, deltas):
+        """
+        Ajoute {produit: quantité} aux niveaux de stock en une requête atomique
+        et retourne les nouveaux niveaux {produit: quantité}.
+        """
+        deltas = sorted((product_id, quantity) for product_id, quantity in deltas.items() if quantity)
+        if not deltas:
+            return {}
+        values = ", ".join(["(%s, %s)"] * len(deltas))
+        self.env.cr.execute(f"""
+            INSERT INTO bike_stock_level (product_id, quantity)
+                 VALUES {values}
+            ON CONFLICT (product_id) DO UPDATE
+                    SET quantity = bike_stock_level.quantity + EXCLUDED.quantity
+              RETURNING product_id, quantity
+        """, [v for delta in deltas for v in delta])
+        levels = dict(self.env.cr.fetchall())
+        self.invalidate_model(["quantity"])
+        return levels
+
+
+class BikeStockSnapshot(models.Model):
+    """
+    Instantanés périodiques du stock : quantité cumulée de chaque produit à une date.
+    Le stock courant (ou à une date) se lit à partir du dernier instantané et des
+    seuls mouvements postérieurs.
+    """
+    _name = "bike.stock.snapshot"
+    _description = "Instantané de stock"
+    _order = "date desc, product_id"
+    _log_access = False
+
+    product_id = fields.Many2one("bike.product", string="Produit", required=True, ondelete="cascade")
+    date = fields.Datetime(string="Date", required=True)
+    quantity = fields.Integer(string="Quantité")
+
+    # Requise par l'INSERT ... ON CONFLICT de _take_snapshots
+    _product_date_unique = models.Constraint("unique(product_id, date)", "Un seul instantané par produit et par date !")
+
+    @api.model
+    def _take_snapshots(self, cutoff=None):
+        """
+        Crée un instantané à la date limite pour chaque produit ayant des mouvements
+        depuis son dernier instantané (une seule requête). Retourne le nombre créé.
+        """
+        if cutoff is None:
+            cutoff = fields.Datetime.now() - SNAPSHOT_MARGIN
+        self.env["bike.stock.move"].flush_model(["product_id", "date", "quantity"])
+        self.flush_model()
+        self.env.cr.execute("""
+            WITH last AS (
+                SELECT DISTINCT ON (product_id) product_id, date, quantity
+                  FROM bike_stock_snapshot
+                 WHERE date <= %(cutoff)s
+              ORDER BY product_id, date DESC
+            )
+            INSERT INTO bike_stock_snapshot (product_id, date, quantity)
+            SELECT m.product_id, %(cutoff)s, COALESCE(l.quantity, 0) + SUM(m.quantity)
+              FROM bike_stock_move m
+         LEFT JOIN last l ON l.product_id = m.product_id
+             WHERE m.date <= %(cutoff)s
+               AND (l.date IS NULL OR m.date > l.date)
+          GROUP BY m.product_id, l.quantity
+                ON CONFLICT (product_id, date) DO NOTHING
+        """, {"cutoff": cutoff})
+        count = self.env.cr.rowcount
+        self.invalidate_model()
+        return count
+
+    @api.model
+    def _cron_take_snapshots(self):
+        """Tâche planifiée : instantané quotidien du stock"""
+        self._take_snapshots()
+
+
+class BikeStockAudit(models.TransientModel):
+    """
+    Assistant d'inventaire : affiche le stock des produits à une date donnée
+    """
+    _name = "bike.stock.audit"
+    _description = "Stock à date"
+
+    date = fields.Datetime(string="Stock au", required=True, default=fields.Datetime.now)
+
+    def action_open_products(self):
+        self.ensure_one()
+        return {
+            "type": "ir.actions.act_window",
+            "name": _("Stock au %s") % fields.Datetime.to_string(self.date),
+            "res_model": "bike.product",
+            "view_mode": "list,form",
+            "views": [(self.env.ref("bike_manager.view_bike_product_tree").id, "list"), (False, "form")],
+            "context": {"stock_date": fields.Datetime.to_string(self.date)},
+        }
@@ -0,0 +1,21 @@
+from odoo.tests import TransactionCase, tagged
+
+# Échelle du banc d'essai : quelques milliers de locations, une centaine de vélos
+SEED_SCALE = 0.01
+# Tables contrôlées : celles peuplées au-delà de ce nombre de lignes
+MIN_ROWS = 100
+
+
+@tagged('post_install', '-at_install')
+class TestQueryPlans(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env['bike.benchmark']._seed(SEED_SCALE)
+
+    def test_hot_queries_use_indexes(self):
+        # Sur une petite base, le planificateur préfère souvent un parcours séquentiel :
+        # interdit ici, il n'en reste que là où aucun index n'est utilisable
+        self.env.cr.execute("SET LOCAL enable_seqscan = off")
+        self.assertTrue(self.env['bike.query.plan']._check_query_plans(min_rows=MIN_ROWS))